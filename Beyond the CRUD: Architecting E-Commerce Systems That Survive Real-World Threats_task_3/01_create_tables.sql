@@ -30,8 +30,10 @@ CREATE TABLE IF NOT EXISTS products (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Ledger partitioned by month on created_at (see create_inventory_partition);
+-- the partition key has to be part of the primary key
 CREATE TABLE IF NOT EXISTS inventory_transactions (
-    transaction_id SERIAL PRIMARY KEY,
+    transaction_id SERIAL,
     product_id INTEGER REFERENCES products(product_id) ON DELETE CASCADE,
     transaction_type VARCHAR(20) CHECK (transaction_type IN ('PURCHASE', 'SALE', 'RETURN', 'ADJUSTMENT')),
     quantity_change INTEGER NOT NULL,
@@ -39,9 +41,14 @@ CREATE TABLE IF NOT EXISTS inventory_transactions (
     new_quantity INTEGER NOT NULL,
     reference VARCHAR(100),
     notes TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    created_by VARCHAR(100)
-);
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_by VARCHAR(100),
+    PRIMARY KEY (transaction_id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Catches rows outside every monthly partition
+CREATE TABLE IF NOT EXISTS inventory_transactions_default
+    PARTITION OF inventory_transactions DEFAULT;
 
 -- Create indexes for better performance
 CREATE INDEX idx_products_category ON products(category_id);
@@ -49,6 +56,63 @@ CREATE INDEX idx_products_supplier ON products(supplier_id);
 CREATE INDEX idx_transactions_product ON inventory_transactions(product_id);
 CREATE INDEX idx_transactions_date ON inventory_transactions(created_at);
 
+-- Monthly ledger partitions: inventory_transactions_YYYY_MM
+-- Creates the partition holding `month` if missing. Rows for that month that
+-- already landed in the default partition are moved into it first.
+CREATE OR REPLACE FUNCTION create_inventory_partition(month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    lower_bound TIMESTAMP := date_trunc('month', month);
+    upper_bound TIMESTAMP := date_trunc('month', month) + INTERVAL '1 month';
+    partition_name TEXT := 'inventory_transactions_' || to_char(month, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+    
+    EXECUTE format('CREATE TABLE %I (LIKE inventory_transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                   partition_name);
+    -- Inserted directly into the detached table, so the rollup trigger does not fire again
+    EXECUTE format('WITH moved AS (DELETE FROM inventory_transactions_default
+                                   WHERE created_at >= %L AND created_at < %L RETURNING *)
+                    INSERT INTO %I SELECT * FROM moved',
+                   lower_bound, upper_bound, partition_name);
+    EXECUTE format('ALTER TABLE inventory_transactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   partition_name, lower_bound, upper_bound);
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Runs with the owner's rights: only roles granted in 03_create_users.sql may call it
+REVOKE EXECUTE ON FUNCTION create_inventory_partition(DATE) FROM PUBLIC;
+
+-- Detaches the partition holding `month` and optionally drops it (after it
+-- has been archived). Returns the partition name, or NULL if there is none.
+CREATE OR REPLACE FUNCTION detach_inventory_partition(month DATE, drop_table BOOLEAN DEFAULT false)
+RETURNS TEXT AS $$
+DECLARE
+    partition_name TEXT := 'inventory_transactions_' || to_char(month, 'YYYY_MM');
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_inherits
+                   WHERE inhparent = 'inventory_transactions'::regclass
+                     AND inhrelid = to_regclass(partition_name)) THEN
+        RETURN NULL;
+    END IF;
+    
+    EXECUTE format('ALTER TABLE inventory_transactions DETACH PARTITION %I', partition_name);
+    IF drop_table THEN
+        EXECUTE format('DROP TABLE %I', partition_name);
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION detach_inventory_partition(DATE, BOOLEAN) FROM PUBLIC;
+
+-- Current month and the next three
+SELECT create_inventory_partition((date_trunc('month', CURRENT_DATE) + n * INTERVAL '1 month')::date)
+FROM generate_series(0, 3) AS n;
+
 -- Create trigger to update product updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -59,4 +123,137 @@ END;
 $$ language 'plpgsql';
 
 CREATE TRIGGER update_products_updated_at BEFORE UPDATE
-    ON products FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
\ No newline at end of file
+    ON products FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Rollups for dashboards: precomputed so reports do not rescan the ledger
+
+-- Per product / day / movement type, maintained from ledger inserts
+-- (the ledger is append-only)
+CREATE TABLE IF NOT EXISTS daily_product_movements (
+    product_id INTEGER REFERENCES products(product_id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    transaction_type VARCHAR(20) NOT NULL,
+    movements INTEGER NOT NULL DEFAULT 0,
+    quantity_change INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, day, transaction_type)
+);
+
+CREATE INDEX idx_daily_movements_day ON daily_product_movements(day, transaction_type);
+
+-- One upsert per statement (not per row); keys are taken in sorted order so
+-- concurrent batches touching the same products cannot deadlock here. Runs
+-- with the owner's rights: writers have no INSERT/UPDATE on the rollup itself
+CREATE OR REPLACE FUNCTION rollup_inventory_transactions()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO daily_product_movements AS d
+        (product_id, day, transaction_type, movements, quantity_change)
+    SELECT product_id, created_at::date, transaction_type, count(*), sum(quantity_change)
+    FROM new_rows
+    WHERE product_id IS NOT NULL AND transaction_type IS NOT NULL
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+    ON CONFLICT (product_id, day, transaction_type) DO UPDATE
+    SET movements = d.movements + EXCLUDED.movements,
+        quantity_change = d.quantity_change + EXCLUDED.quantity_change;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE TRIGGER rollup_inventory_transactions AFTER INSERT
+    ON inventory_transactions REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_inventory_transactions();
+
+-- Recompute the movement rollup from scratch (e.g. after a manual ledger fix)
+CREATE OR REPLACE FUNCTION rebuild_daily_product_movements()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE inventory_transactions IN SHARE MODE;
+    DELETE FROM daily_product_movements;
+    INSERT INTO daily_product_movements
+        (product_id, day, transaction_type, movements, quantity_change)
+    SELECT product_id, created_at::date, transaction_type, count(*), sum(quantity_change)
+    FROM inventory_transactions
+    WHERE product_id IS NOT NULL AND transaction_type IS NOT NULL
+    GROUP BY 1, 2, 3;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Runs with the owner's rights: only roles granted in 03_create_users.sql may call it
+REVOKE EXECUTE ON FUNCTION rebuild_daily_product_movements() FROM PUBLIC;
+
+-- Stock valuation per category, refreshed concurrently when products changed
+CREATE MATERIALIZED VIEW IF NOT EXISTS category_stock_value AS
+SELECT COALESCE(c.category_id, 0) AS category_id,
+       COALESCE(c.category_name, 'Uncategorized') AS category_name,
+       count(*) AS products,
+       sum(p.quantity) AS units,
+       sum(p.price * p.quantity) AS stock_value,
+       sum((p.price - p.cost) * p.quantity) AS stock_margin
+FROM products p
+LEFT JOIN categories c ON c.category_id = p.category_id
+GROUP BY 1, 2;
+
+-- REFRESH ... CONCURRENTLY needs a unique index
+CREATE UNIQUE INDEX idx_category_stock_value ON category_stock_value(category_id);
+
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    rollup_name VARCHAR(100) PRIMARY KEY,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Pending source changes per rollup, one row per writing statement. Rows only
+-- become visible when the writer commits, so a refresh never skips a change
+-- that committed out of order (an updated_at watermark would).
+CREATE TABLE IF NOT EXISTS rollup_changes (
+    rollup_name VARCHAR(100) NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE OR REPLACE FUNCTION note_category_stock_value_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO rollup_changes (rollup_name) VALUES ('category_stock_value');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Inserts, updates and deletes all count; so does renaming a category
+CREATE TRIGGER note_products_change AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON products FOR EACH STATEMENT EXECUTE FUNCTION note_category_stock_value_change();
+CREATE TRIGGER note_categories_change AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE
+    ON categories FOR EACH STATEMENT EXECUTE FUNCTION note_category_stock_value_change();
+
+-- Refresh category_stock_value unless nothing changed since the last refresh;
+-- returns whether it refreshed. Changes still in flight stay pending and are
+-- picked up by the next call.
+CREATE OR REPLACE FUNCTION refresh_category_stock_value(force BOOLEAN DEFAULT false)
+RETURNS BOOLEAN AS $$
+DECLARE
+    pending BOOLEAN;
+BEGIN
+    -- Serialises concurrent refreshers
+    INSERT INTO rollup_watermarks (rollup_name) VALUES ('category_stock_value')
+    ON CONFLICT (rollup_name) DO NOTHING;
+    PERFORM 1 FROM rollup_watermarks
+    WHERE rollup_name = 'category_stock_value' FOR UPDATE;
+    
+    -- Consumed before the refresh, whose snapshot then includes these changes
+    WITH consumed AS (
+        DELETE FROM rollup_changes WHERE rollup_name = 'category_stock_value'
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM consumed) INTO pending;
+    
+    IF NOT force AND NOT pending THEN
+        RETURN false;
+    END IF;
+    
+    REFRESH MATERIALIZED VIEW CONCURRENTLY category_stock_value;
+    UPDATE rollup_watermarks SET refreshed_at = CURRENT_TIMESTAMP
+    WHERE rollup_name = 'category_stock_value';
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION refresh_category_stock_value(BOOLEAN) FROM PUBLIC;
\ No newline at end of file
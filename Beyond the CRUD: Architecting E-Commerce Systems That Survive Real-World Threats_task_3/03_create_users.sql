@@ -4,6 +4,8 @@ CREATE USER app_user WITH PASSWORD 'app_password123';
 GRANT CONNECT ON DATABASE ecommerce_db TO app_user;
 GRANT USAGE ON SCHEMA public TO app_user;
 GRANT SELECT, INSERT, UPDATE ON ALL TABLES IN SCHEMA public TO app_user;
+-- Rollup state is written only by SECURITY DEFINER triggers and functions
+REVOKE INSERT, UPDATE ON daily_product_movements, rollup_changes, rollup_watermarks FROM app_user;
 GRANT USAGE ON ALL SEQUENCES IN SCHEMA public TO app_user;
 
 -- Read-only user for reporting
@@ -15,4 +17,12 @@ GRANT SELECT ON ALL TABLES IN SCHEMA public TO report_user;
 -- Admin user (not the superuser)
 CREATE USER inventory_admin WITH PASSWORD 'admin_pass789';
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO inventory_admin;
-GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public TO inventory_admin;
\ No newline at end of file
+GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public TO inventory_admin;
+
+-- Ledger partition maintenance (SECURITY DEFINER functions, not executable by PUBLIC)
+GRANT EXECUTE ON FUNCTION create_inventory_partition(DATE) TO app_user, inventory_admin;
+GRANT EXECUTE ON FUNCTION detach_inventory_partition(DATE, BOOLEAN) TO app_user, inventory_admin;
+
+-- Rollup maintenance; report_user reads the rollups but cannot rebuild or refresh them
+GRANT EXECUTE ON FUNCTION rebuild_daily_product_movements() TO app_user, inventory_admin;
+GRANT EXECUTE ON FUNCTION refresh_category_stock_value(BOOLEAN) TO app_user, inventory_admin;
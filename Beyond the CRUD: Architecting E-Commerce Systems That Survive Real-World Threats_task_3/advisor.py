@@ -0,0 +1,238 @@
+from psycopg2 import sql
+from typing import List, Dict, Any, Optional, Tuple
+from security import QueryBuilder
+from database import DatabaseManager
+
+
+class IndexAdvisor:
+    """Suggests B-tree indexes for the filters QueryBuilder statements actually use
+    
+    Filter columns and operators come from the statement shapes recorded in
+    DatabaseManager.metrics, weighted by their observed latency. They are
+    cross-checked against existing indexes (pg_index), table size and scan
+    counts (pg_stat_user_tables) and column selectivity (pg_stats).
+    """
+    
+    EQUALITY_OPERATORS = {'=', 'IN'}
+    RANGE_OPERATORS = {'>', '<', '>=', '<='}
+    
+    # Equality columns matching more than this fraction of rows are not worth an index
+    MAX_SELECTIVITY = 0.1
+    
+    INDEX_COLUMNS_QUERY = """
+        SELECT array_agg(a.attname::text ORDER BY k.ord) AS columns
+        FROM pg_index i
+        CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+        WHERE i.indrelid = %s::regclass
+        GROUP BY i.indexrelid
+    """
+    
+    # Summed over leaf partitions so partitioned tables report real activity
+    # (pg_partition_tree is empty for a plain table, hence the OR)
+    TABLE_STATS_QUERY = """
+        SELECT COALESCE(sum(s.seq_scan), 0) AS seq_scan,
+               COALESCE(sum(s.seq_tup_read), 0) AS seq_tup_read,
+               COALESCE(sum(s.idx_scan), 0) AS idx_scan,
+               COALESCE(sum(s.n_live_tup), 0) AS n_live_tup,
+               (SELECT relkind = 'p' FROM pg_class WHERE oid = %(table)s::regclass) AS partitioned
+        FROM pg_stat_user_tables s
+        WHERE s.relid = %(table)s::regclass
+           OR s.relid IN (SELECT relid FROM pg_partition_tree(%(table)s::regclass) WHERE isleaf)
+    """
+    
+    COLUMN_STATS_QUERY = """
+        SELECT attname, n_distinct, most_common_freqs
+        FROM pg_stats
+        WHERE schemaname = 'public' AND tablename = %s
+        ORDER BY inherited
+    """
+    
+    def __init__(self, db: DatabaseManager, min_rows: int = 1000):
+        self.db = db
+        self.min_rows = min_rows
+    
+    def usage(self) -> Dict[Tuple[str, Tuple[str, ...], Optional[str]], Dict[str, float]]:
+        """Candidate index keys with the calls and latency of the statements needing them
+        
+        A key is (table, equality columns, range column); equality columns
+        come first in the index, followed by at most one range column.
+        """
+        if self.db.metrics is None:
+            return {}
+        candidates: Dict[Tuple[str, Tuple[str, ...], Optional[str]], Dict[str, float]] = {}
+        for shape, stats in self.db.metrics.shape_stats():
+            filters = QueryBuilder.shape_filters(shape)
+            if not filters or not filters[1]:
+                continue
+            table, predicates = filters
+            equality = tuple(sorted({col for col, op in predicates if op in self.EQUALITY_OPERATORS}))
+            ranges = [col for col, op in predicates
+                      if op in self.RANGE_OPERATORS and col not in equality]
+            if not equality and not ranges:
+                continue
+            key = (table, equality, ranges[0] if ranges else None)
+            usage = candidates.setdefault(key, {'calls': 0, 'total_ms': 0.0, 'p95_ms': 0.0})
+            usage['calls'] += stats['calls']
+            usage['total_ms'] += stats['total_ms']
+            usage['p95_ms'] = max(usage['p95_ms'], stats['p95_ms'])
+        return candidates
+    
+    def _existing_indexes(self, table: str) -> List[List[str]]:
+        rows = self.db.execute_query(self.INDEX_COLUMNS_QUERY, (table,)) or []
+        return [row['columns'] for row in rows]
+    
+    @staticmethod
+    def _covered(columns: List[str], equality: Tuple[str, ...], range_column: Optional[str],
+                 indexes: List[List[str]]) -> bool:
+        """An index whose leading columns are the equality set, then the range column"""
+        width = len(equality)
+        for index in indexes:
+            if len(index) < len(columns) or set(index[:width]) != set(equality):
+                continue
+            if range_column is None or index[width] == range_column:
+                return True
+        return False
+    
+    def _selectivity(self, column_stats: Dict[str, Dict], column: str, rows: int) -> Optional[float]:
+        """Worst-case fraction of rows matched by one equality value (None if unknown)"""
+        stats = column_stats.get(column)
+        if not stats or not rows:
+            return None
+        if stats['most_common_freqs']:
+            return max(stats['most_common_freqs'])
+        distinct = stats['n_distinct']
+        distinct = distinct if distinct > 0 else -distinct * rows
+        return 1.0 / distinct if distinct else None
+    
+    def recommend(self) -> List[Dict[str, Any]]:
+        """Missing indexes for observed filters, most expensive first"""
+        recommendations = []
+        table_info: Dict[str, Tuple[Dict, List[List[str]], Dict[str, Dict]]] = {}
+        
+        for (table, equality, range_column), usage in self.usage().items():
+            if table not in table_info:
+                stats = self.db.execute_query(self.TABLE_STATS_QUERY, {'table': table})
+                column_rows = self.db.execute_query(self.COLUMN_STATS_QUERY, (table,)) or []
+                # ORDER BY inherited: whole-hierarchy stats of a partitioned table win
+                table_info[table] = (stats[0] if stats else {}, self._existing_indexes(table),
+                                     {row['attname']: row for row in column_rows})
+            stats, indexes, column_stats = table_info[table]
+            
+            columns = list(equality) + ([range_column] if range_column else [])
+            if self._covered(columns, equality, range_column, indexes):
+                continue
+            rows = int(stats.get('n_live_tup') or 0)
+            if rows < self.min_rows:
+                continue
+            
+            selectivities = [self._selectivity(column_stats, col, rows) for col in equality]
+            known = [s for s in selectivities if s is not None]
+            if equality and not range_column and known and len(known) == len(equality):
+                combined = 1.0
+                for s in known:
+                    combined *= s
+                if combined > self.MAX_SELECTIVITY:
+                    continue
+            
+            name = f"idx_{table}_{'_'.join(columns)}"[:63]
+            recommendations.append({
+                'table': table,
+                'columns': columns,
+                'index_name': name,
+                'partitioned': bool(stats.get('partitioned')),
+                'calls': usage['calls'],
+                'total_ms': round(usage['total_ms'], 2),
+                'p95_ms': round(usage['p95_ms'], 2),
+                'rows': rows,
+                'seq_scans': int(stats.get('seq_scan') or 0),
+                'selectivity': round(min(known), 4) if known else None,
+            })
+        
+        recommendations.sort(key=lambda r: -r['total_ms'])
+        return recommendations
+    
+    def statements(self, recommendation: Dict[str, Any]) -> List[sql.Composed]:
+        """DDL that builds one recommended index without blocking writes
+        
+        Partitioned tables cannot be indexed CONCURRENTLY directly, so the
+        parent index is created ON ONLY (invalid), each partition is indexed
+        concurrently and attached, which makes the parent index valid.
+        """
+        table = recommendation['table']
+        for col in recommendation['columns']:
+            if not QueryBuilder.validate_identifier(table, col):
+                raise ValueError(f"Invalid column name: {col}")
+        columns = sql.SQL(", ").join(map(sql.Identifier, recommendation['columns']))
+        name = recommendation['index_name']
+        
+        if not recommendation['partitioned']:
+            return [sql.SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} ({})").format(
+                sql.Identifier(name), sql.Identifier(table), columns
+            )]
+        
+        statements = [sql.SQL("CREATE INDEX IF NOT EXISTS {} ON ONLY {} ({})").format(
+            sql.Identifier(name), sql.Identifier(table), columns
+        )]
+        partitions = self.db.execute_query(
+            "SELECT inhrelid::regclass::text AS partition FROM pg_inherits "
+            "WHERE inhparent = %s::regclass ORDER BY 1", (table,)
+        ) or []
+        for row in partitions:
+            partition_index = f"{row['partition']}_{'_'.join(recommendation['columns'])}_idx"[:63]
+            statements.append(sql.SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} ({})").format(
+                sql.Identifier(partition_index), sql.Identifier(row['partition']), columns
+            ))
+            statements.append(sql.SQL("ALTER INDEX {} ATTACH PARTITION {}").format(
+                sql.Identifier(name), sql.Identifier(partition_index)
+            ))
+        return statements
+    
+    def advise(self, apply: bool = False) -> List[Dict[str, Any]]:
+        """Print recommendations with their DDL; with `apply` also create them"""
+        if self.db.metrics is None:
+            print("⚠️ Query metrics are disabled, no filter usage recorded")
+            return []
+        recommendations = self.recommend()
+        if not recommendations:
+            print("✅ No missing indexes for the recorded filters")
+            return []
+        
+        for rec in recommendations:
+            print(f"\n📌 {rec['table']} ({', '.join(rec['columns'])}): {rec['calls']} calls, "
+                  f"{rec['total_ms']} ms total, p95 {rec['p95_ms']} ms, "
+                  f"{rec['rows']} rows, {rec['seq_scans']} seq scans")
+            for statement in self.statements(rec):
+                print(f"   {statement.as_string(self.db.cursor)};")
+        
+        if apply:
+            self.create(recommendations)
+        return recommendations
+    
+    def create(self, recommendations: List[Dict[str, Any]]) -> int:
+        """Build recommended indexes concurrently; returns how many are now valid
+        
+        CREATE INDEX CONCURRENTLY cannot run in a transaction, so statements
+        are issued one by one on the autocommit connection. Needs a role that
+        owns the tables (e.g. the admin user).
+        """
+        if self.db.in_transaction:
+            print("❌ Indexes cannot be created concurrently inside a transaction")
+            return 0
+        created = 0
+        for rec in recommendations:
+            for statement in self.statements(rec):
+                self.db.execute_query(statement.as_string(self.db.cursor))
+            rec['created'] = self._index_valid(rec['index_name'])
+            if rec['created']:
+                created += 1
+                self.db.log_success(f"Created index {rec['index_name']} on {rec['table']}")
+            else:
+                print(f"❌ Index {rec['index_name']} was not created (see log)")
+        return created
+    
+    def _index_valid(self, name: str) -> bool:
+        rows = self.db.execute_query(
+            "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,)
+        )
+        return bool(rows and rows[0]['indisvalid'])
@@ -0,0 +1,235 @@
+import json
+import sys
+import time
+from typing import List, Dict, Any, Iterator, TextIO
+from psycopg2.extensions import TRANSACTION_STATUS_INERROR
+from database import DatabaseManager
+from operations import InventoryOperations
+from importer import CsvImporter
+
+
+class StepFailed(Exception):
+    """A batch step reported an error"""
+
+
+class BatchRunner:
+    """Runs a job of InventoryOperations steps without prompts
+    
+    A job is a JSON or YAML document
+    
+        {"transaction": false, "stop_on_error": true,
+         "steps": [{"op": "filter", "table": "products",
+                    "filters": [["price", ">", 100]], "limit": 10}, ...]}
+    
+    or a JSON Lines stream of steps (one object per line, e.g. on stdin),
+    which is executed as lines arrive. All steps share the session
+    connection and its prepared statements; with "transaction" they run as
+    one unit of work, each step under its own savepoint.
+    """
+    
+    OPERATIONS = ('filter', 'update', 'bulk_update', 'insert', 'movements',
+                  'report', 'export', 'import', 'refresh')
+    
+    def __init__(self, db: DatabaseManager, operations: InventoryOperations):
+        self.db = db
+        self.operations = operations
+        self.results: List[Dict[str, Any]] = []
+    
+    @staticmethod
+    def load_job(path: str) -> Dict[str, Any]:
+        """Read a JSON or YAML job file ('-' is handled by stream_steps)"""
+        with open(path, encoding='utf-8') as f:
+            if path.endswith(('.yaml', '.yml')):
+                try:
+                    import yaml
+                except ImportError:
+                    raise RuntimeError("YAML job files require the 'PyYAML' package")
+                job = yaml.safe_load(f)
+            elif path.endswith('.jsonl'):
+                job = {'steps': list(BatchRunner.stream_steps(f))}
+            else:
+                job = json.load(f)
+        if isinstance(job, list):
+            job = {'steps': job}
+        if not isinstance(job, dict) or not isinstance(job.get('steps'), list):
+            raise ValueError("Job must be a list of steps or an object with a 'steps' list")
+        return job
+    
+    @staticmethod
+    def stream_steps(stream: TextIO) -> Iterator[Dict[str, Any]]:
+        """Steps from a JSON Lines stream, yielded as each line is read"""
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Line {number}: invalid JSON ({e})")
+    
+    @staticmethod
+    def _filters(step: Dict[str, Any]) -> List[tuple]:
+        return [tuple(f) for f in step.get('filters', [])]
+    
+    def _filter(self, step: Dict[str, Any]) -> int:
+        rows = self.operations.filter_multiple_values(
+            step['table'], self._filters(step), step.get('columns'),
+            step.get('order_by'), step.get('limit'), quiet=not step.get('show', False)
+        )
+        if rows is None:
+            raise StepFailed("filter failed")
+        return len(rows)
+    
+    def _update(self, step: Dict[str, Any]) -> int:
+        if 'id' in step:
+            updated = self.operations.update_single_record(step['table'], step['id'], step['set'])
+        else:
+            (column, value), = step['set'].items()
+            updated = self.operations.update_multiple_records(
+                step['table'], step['where'], step['values'], column, value
+            )
+        if updated is None:
+            raise StepFailed("update failed")
+        return updated
+    
+    def _bulk_update(self, step: Dict[str, Any]) -> int:
+        matched = self.operations.bulk_update(
+            step['table'], [(key, values) for key, values in step['updates']],
+            step.get('chunk_size', 5000)
+        )
+        if matched is None:
+            raise StepFailed("bulk update failed")
+        return sum(1 for count in matched.values() if count)
+    
+    def _insert(self, step: Dict[str, Any]) -> int:
+        records = step['records']
+        if len(records) == 1:
+            inserted = self.operations.insert_single_record(step['table'], records[0])
+        else:
+            inserted = self.operations.insert_multiple_records(step['table'], records)
+        if inserted is None:
+            raise StepFailed("insert failed")
+        return len(records)
+    
+    def _movements(self, step: Dict[str, Any]) -> int:
+        result = self.operations.record_stock_movements(step['movements'], step.get('created_by'))
+        if result is None:
+            raise StepFailed("stock movements failed")
+        if result['rejected'] and step.get('strict', True):
+            raise StepFailed(f"{len(result['rejected'])} movements rejected")
+        return len(result['applied'])
+    
+    def _report(self, step: Dict[str, Any]) -> int:
+        rows = self.operations.run_report(
+            step['name'], self._filters(step), step.get('limit'),
+            quiet=not step.get('show', True)
+        )
+        if rows is None:
+            raise StepFailed("report failed")
+        return len(rows)
+    
+    def _export(self, step: Dict[str, Any]) -> int:
+        rows = self.operations.export_table(
+            step['table'], step['path'], step.get('format', 'csv'), self._filters(step),
+            step.get('compress', False), step.get('columns')
+        )
+        if rows is None:
+            raise StepFailed("export failed")
+        return rows
+    
+    def _import(self, step: Dict[str, Any]) -> int:
+        counts = CsvImporter(self.operations, step.get('chunk_size', 10000)).import_file(
+            step['table'], step['path'], step.get('reject_path')
+        )
+        if counts is None:
+            raise StepFailed("import failed")
+        if counts['rejected'] and step.get('strict', False):
+            raise StepFailed(f"{counts['rejected']} rows rejected")
+        return counts['loaded']
+    
+    def _refresh(self, step: Dict[str, Any]) -> int:
+        if self.operations.refresh_rollups(step.get('force', False), quiet=True) is None:
+            raise StepFailed("rollup refresh failed")
+        return 0
+    
+    def run_step(self, number: int, step: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute one step and record its outcome and wall-clock time"""
+        op = step.get('op') if isinstance(step, dict) else None
+        result = {'step': number, 'op': op,
+                  'target': step.get('table') or step.get('name', '') if isinstance(step, dict) else '',
+                  'status': 'ok', 'rows': 0, 'ms': 0.0, 'error': ''}
+        started = time.perf_counter()
+        try:
+            if op not in self.OPERATIONS:
+                raise StepFailed(f"Unknown operation '{op}'")
+            handler = getattr(self, f"_{op}")
+            if self.db.in_transaction:
+                with self.db.savepoint():
+                    result['rows'] = handler(step)
+                    if self.db.connection.info.transaction_status == TRANSACTION_STATUS_INERROR:
+                        raise StepFailed("statement failed")
+            else:
+                result['rows'] = handler(step)
+        except (StepFailed, KeyError, TypeError, ValueError) as e:
+            result['status'] = 'failed'
+            result['error'] = f"missing field {e}" if isinstance(e, KeyError) else str(e)
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = str(e).strip()
+        result['ms'] = round((time.perf_counter() - started) * 1000, 2)
+        
+        self.results.append(result)
+        status = "✅" if result['status'] == 'ok' else "❌"
+        print(f"{status} Step {number} {op} {result['target']}: {result['rows']} rows "
+              f"in {result['ms']} ms" + (f" ({result['error']})" if result['error'] else ""))
+        return result
+    
+    def run(self, steps, transaction: bool = False, stop_on_error: bool = True) -> bool:
+        """Run steps in order; returns True if every step succeeded
+        
+        With `transaction` a failing step rolls back to its savepoint and,
+        when `stop_on_error` is set, the whole job is rolled back.
+        """
+        started = time.perf_counter()
+        ok = True
+        try:
+            if transaction:
+                with self.db.transaction():
+                    ok = self._run_steps(steps, stop_on_error)
+                    if not ok and stop_on_error:
+                        raise StepFailed("job rolled back")
+            else:
+                ok = self._run_steps(steps, stop_on_error)
+        except StepFailed as e:
+            print(f"❌ {e}")
+            ok = False
+        except Exception as e:
+            print(f"❌ Job failed: {str(e).strip()}")
+            ok = False
+        
+        elapsed = (time.perf_counter() - started) * 1000
+        failed = sum(1 for r in self.results if r['status'] != 'ok')
+        print(f"{'✅' if ok else '❌'} {len(self.results)} steps, {failed} failed, {elapsed:.1f} ms total")
+        return ok
+    
+    def _run_steps(self, steps, stop_on_error: bool) -> bool:
+        ok = True
+        for number, step in enumerate(steps, 1):
+            if self.run_step(number, step)['status'] != 'ok':
+                ok = False
+                if stop_on_error:
+                    break
+        return ok
+    
+    def run_job(self, path: str) -> bool:
+        """Run a job file, or a JSON Lines stream of steps from stdin when path is '-'"""
+        if path == '-':
+            return self.run(self.stream_steps(sys.stdin))
+        job = self.load_job(path)
+        return self.run(job['steps'], bool(job.get('transaction', False)),
+                        bool(job.get('stop_on_error', True)))
+    
+    def write_report(self, path: str):
+        """Save per-step results and timings as JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.results, f, indent=2)
@@ -1,38 +1,389 @@
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 from psycopg2 import sql
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2.extensions import (ISOLATION_LEVEL_AUTOCOMMIT, TRANSACTION_STATUS_INERROR,
+                                  TransactionRollbackError)
 import sys
 import os
+import itertools
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from configparser import ConfigParser
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from typing import Optional, List, Tuple, Dict, Any
+from typing import Optional, List, Tuple, Dict, Any, Iterator, Callable, Set
 import logging
+from metrics import QueryMetrics
+
+
+class ConnectionPool:
+    """Thread-safe connection pool with health validation and wait-time metrics"""
+    
+    def __init__(self, minconn: int, maxconn: int, validate: bool = True, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.validate = validate
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, **connect_kwargs)
+        # ThreadedConnectionPool raises when exhausted, so callers queue on this instead
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._replaced = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+    
+    def getconn(self, timeout: Optional[float] = None):
+        """Check out a healthy connection, waiting up to timeout seconds for a free slot"""
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise psycopg2.pool.PoolError(f"No connection available within {timeout} seconds")
+        waited = time.perf_counter() - start
+        
+        try:
+            conn = self._pool.getconn()
+            if self.validate and not self._is_healthy(conn):
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+                with self._lock:
+                    self._replaced += 1
+        except Exception:
+            self._slots.release()
+            raise
+        
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+    
+    def putconn(self, conn, close: bool = False):
+        """Return a connection to the pool, discarding it if it is broken"""
+        try:
+            self._pool.putconn(conn, close=close or bool(conn.closed))
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+    
+    def closeall(self):
+        """Close every connection held by the pool"""
+        self._pool.closeall()
+    
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        """Cheap liveness probe run on checkout"""
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            if not conn.autocommit:
+                conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+    
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool usage and checkout wait times"""
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                'min_connections': self.minconn,
+                'max_connections': self.maxconn,
+                'in_use': self._in_use,
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'replaced_connections': self._replaced,
+                'wait_avg_ms': (self._wait_total / checkouts * 1000) if checkouts else 0.0,
+                'wait_max_ms': self._wait_max * 1000,
+            }
+
+
+class SchemaCatalog:
+    """In-process cache of tables, columns, types, primary and foreign keys"""
+    
+    # One round trip for the whole public schema; mirrors the visibility rules
+    # of information_schema by only listing relations the user has rights on
+    CATALOG_QUERY = """
+        SELECT c.relname AS table_name,
+               c.relkind,
+               has_table_privilege(c.oid, 'SELECT') AS can_select,
+               a.attname AS column_name,
+               format_type(a.atttypid, a.atttypmod) AS data_type,
+               a.attnotnull AS not_null,
+               COALESCE(pk.is_primary_key, false) AS is_primary_key,
+               fk.ref_table,
+               fk.ref_column
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = c.oid
+             AND a.attnum > 0 AND NOT a.attisdropped
+        LEFT JOIN LATERAL (
+            SELECT true AS is_primary_key
+            FROM pg_constraint p
+            WHERE p.conrelid = c.oid AND p.contype = 'p'
+              AND a.attnum = ANY (p.conkey)
+        ) pk ON true
+        LEFT JOIN LATERAL (
+            SELECT rc.relname AS ref_table, ra.attname AS ref_column
+            FROM pg_constraint f
+            JOIN pg_class rc ON rc.oid = f.confrelid
+            JOIN pg_attribute ra ON ra.attrelid = f.confrelid
+                 AND ra.attnum = f.confkey[array_position(f.conkey, a.attnum)]
+            WHERE f.conrelid = c.oid AND f.contype = 'f'
+              AND a.attnum = ANY (f.conkey)
+            LIMIT 1
+        ) fk ON true
+        WHERE n.nspname = 'public'
+          AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+          AND NOT c.relispartition
+          AND has_table_privilege(c.oid, 'SELECT, INSERT, UPDATE, DELETE')
+        ORDER BY c.relname, a.attnum
+    """
+    
+    def __init__(self, loader, ttl: float = 300.0):
+        self._loader = loader
+        self.ttl = ttl
+        self._tables: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.RLock()
+        self.loads = 0
+    
+    def invalidate(self):
+        """Drop cached metadata so the next lookup reloads it"""
+        with self._lock:
+            self._loaded_at = None
+    
+    def _ensure_loaded(self) -> Dict[str, Dict[str, Any]]:
+        """Reload the catalog when it is empty or older than the TTL"""
+        with self._lock:
+            fresh = (self._loaded_at is not None and
+                     time.monotonic() - self._loaded_at < self.ttl)
+            if not fresh:
+                rows = self._loader(self.CATALOG_QUERY)
+                if rows is not None:
+                    self._tables = self._build(rows)
+                    self._loaded_at = time.monotonic()
+                    self.loads += 1
+            return self._tables
+    
+    @staticmethod
+    def _build(rows: List[Dict]) -> Dict[str, Dict[str, Any]]:
+        """Group flat catalog rows into per-table metadata"""
+        tables: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            table = tables.setdefault(row['table_name'], {
+                'kind': row['relkind'], 'can_select': row['can_select'],
+                'columns': [], 'types': {}, 'not_null': set(),
+                'primary_key': [], 'foreign_keys': {}
+            })
+            column = row['column_name']
+            table['columns'].append(column)
+            table['types'][column] = row['data_type']
+            if row['not_null']:
+                table['not_null'].add(column)
+            if row['is_primary_key']:
+                table['primary_key'].append(column)
+            if row['ref_table']:
+                table['foreign_keys'][column] = (row['ref_table'], row['ref_column'])
+        for table in tables.values():
+            table['column_set'] = frozenset(table['columns'])
+        return tables
+    
+    def table_names(self) -> List[str]:
+        return sorted(self._ensure_loaded())
+    
+    def has_table(self, table: str) -> bool:
+        return table in self._ensure_loaded()
+    
+    def columns(self, table: str) -> List[str]:
+        info = self._ensure_loaded().get(table)
+        return list(info['columns']) if info else []
+    
+    def has_column(self, table: str, column: str) -> bool:
+        info = self._ensure_loaded().get(table)
+        return bool(info) and column in info['column_set']
+    
+    def kind(self, table: str) -> Optional[str]:
+        """pg_class.relkind of a table ('r', 'p', 'v', 'm' or 'f')"""
+        info = self._ensure_loaded().get(table)
+        return info['kind'] if info else None
+    
+    def can_select(self, table: str) -> bool:
+        """Whether the current role may read the table (it may only have write privileges)"""
+        info = self._ensure_loaded().get(table)
+        return bool(info) and info['can_select']
+    
+    def column_type(self, table: str, column: str) -> Optional[str]:
+        info = self._ensure_loaded().get(table)
+        return info['types'].get(column) if info else None
+    
+    def not_null(self, table: str) -> Set[str]:
+        """Columns declared NOT NULL"""
+        info = self._ensure_loaded().get(table)
+        return set(info['not_null']) if info else set()
+    
+    def primary_key(self, table: str) -> Optional[str]:
+        """Single-column primary key of a table, if it has one"""
+        info = self._ensure_loaded().get(table)
+        if info and len(info['primary_key']) == 1:
+            return info['primary_key'][0]
+        return None
+    
+    def foreign_keys(self, table: str) -> Dict[str, Tuple[str, str]]:
+        """Map of column -> (referenced table, referenced column)"""
+        info = self._ensure_loaded().get(table)
+        return dict(info['foreign_keys']) if info else {}
+
 
 class DatabaseManager:
-    def __init__(self, log_file: Optional[str] = None):
-        self.connection = None
-        self.cursor = None
+    ISOLATION_LEVELS = ('READ COMMITTED', 'REPEATABLE READ', 'SERIALIZABLE')
+    
+    # Whole-schema overview in one statement: estimates come from pg_class
+    # (reltuples/relpages, summed over leaf partitions) instead of COUNT(*)
+    SCHEMA_OVERVIEW_QUERY = """
+        {samples}
+        SELECT c.relname AS table_name,
+               CASE c.relkind WHEN 'r' THEN 'table' WHEN 'p' THEN 'partitioned'
+                    WHEN 'v' THEN 'view' WHEN 'm' THEN 'materialized view'
+                    ELSE 'foreign table' END AS kind,
+               stats.row_estimate,
+               stats.total_bytes,
+               pg_size_pretty(stats.total_bytes) AS total_size,
+               (SELECT json_agg(json_build_object(
+                           'name', a.attname,
+                           'type', format_type(a.atttypid, a.atttypmod),
+                           'not_null', a.attnotnull) ORDER BY a.attnum)
+                FROM pg_attribute a
+                WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped) AS columns,
+               (SELECT json_agg(i.relname || substring(pg_get_indexdef(x.indexrelid) FROM ' USING .*$')
+                                ORDER BY i.relname)
+                FROM pg_index x
+                JOIN pg_class i ON i.oid = x.indexrelid
+                WHERE x.indrelid = c.oid) AS indexes,
+               {sample_column} AS sample
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        CROSS JOIN LATERAL (
+            SELECT CASE WHEN bool_or(p.reltuples < 0) THEN NULL
+                        ELSE sum(p.reltuples)::bigint END AS row_estimate,
+                   sum(pg_total_relation_size(p.oid))::bigint AS total_bytes
+            FROM pg_class p
+            WHERE (p.oid = c.oid AND p.relkind <> 'p')
+               OR p.oid IN (SELECT relid FROM pg_partition_tree(c.oid) WHERE isleaf)
+        ) stats
+        {sample_join}
+        WHERE n.nspname = 'public'
+          AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+          AND NOT c.relispartition
+          AND has_table_privilege(c.oid, 'SELECT, INSERT, UPDATE, DELETE')
+        ORDER BY c.relname
+    """
+    
+    # Pages TABLESAMPLE SYSTEM should read per table; enough that an empty sample is unlikely
+    SAMPLE_PAGES = 8
+    
+    def __init__(self, log_file: Optional[str] = None, config: Optional[ConfigParser] = None):
+        self._connection = None
+        self._cursor = None
+        self._local = threading.local()
+        self.pool: Optional[ConnectionPool] = None
         self.log_file = log_file
-        self.setup_logging()
+        
+        config = config or ConfigParser()
+        # Pooled mode is enabled when [application] max_connections allows more than one
+        self.max_connections = config.getint('application', 'max_connections', fallback=1)
+        self.min_connections = config.getint('application', 'min_connections', fallback=1)
+        self.pool_timeout = config.getfloat('application', 'pool_timeout', fallback=30.0)
+        self.stream_itersize = config.getint('application', 'stream_itersize', fallback=2000)
+        self._stream_ids = itertools.count(1)
+        self._savepoint_ids = itertools.count(1)
+        
+        # Statements autocommit unless grouped with transaction()
+        self.isolation_level = config.get('application', 'isolation_level',
+                                          fallback='READ COMMITTED').upper()
+        self.transaction_retries = config.getint('application', 'transaction_retries', fallback=3)
+        
+        # Per statement-shape latency metrics and slow-query log (0 disables it)
+        self.metrics = (QueryMetrics()
+                        if config.getboolean('application', 'query_metrics', fallback=True)
+                        else None)
+        self.slow_query_ms = config.getfloat('application', 'slow_query_ms', fallback=500.0)
+        
+        # Prepared statements live per backend session: (conn id, pid) -> LRU of shape -> name
+        self.prepared_cache_size = config.getint('application', 'prepared_cache_size', fallback=128)
+        self._prepared: Dict[Tuple[int, int], OrderedDict] = {}
+        self._statement_ids = itertools.count(1)
+        self._prepared_lock = threading.Lock()
+        self.prepared_hits = 0
+        self.prepared_misses = 0
+        self.prepared_evictions = 0
+        self.catalog = SchemaCatalog(
+            self.execute_query,
+            ttl=config.getfloat('application', 'schema_cache_ttl', fallback=300.0)
+        )
+        
+        # Warm sessions of other roles, parked by switch_user: username -> session state.
+        # [roles] lists username = password pairs opened by warm_roles(); reports are
+        # routed to [application] report_role when it has a warm session.
+        self.username: Optional[str] = None
+        self.target: Optional[Tuple[str, str, str]] = None
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self.role_credentials = dict(config.items('roles')) if config.has_section('roles') else {}
+        self.report_role = config.get('application', 'report_role', fallback=None)
+        
+        # Handlers are attached on first log call (see logger)
+        self._logger: Optional[logging.Logger] = None
+    
+    @property
+    def logger(self) -> logging.Logger:
+        """Application logger, set up lazily so constructing the manager stays cheap"""
+        if self._logger is None:
+            self.setup_logging()
+        return self._logger
+    
+    @property
+    def connection(self):
+        """Connection checked out by the current thread, or the session connection"""
+        return getattr(self._local, 'connection', None) or self._connection
+    
+    @property
+    def cursor(self):
+        """Cursor bound to the current thread's connection"""
+        return getattr(self._local, 'cursor', None) or self._cursor
+    
+    @property
+    def in_transaction(self) -> bool:
+        """True inside a transaction() block on the current thread"""
+        return getattr(self._local, 'tx_depth', 0) > 0
         
     def setup_logging(self):
         """Setup logging to stdout/stderr and file if specified"""
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.INFO)
+        self._logger = logging.getLogger(__name__)
+        self._logger.setLevel(logging.INFO)
         
         # Console handler
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(logging.INFO)
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
+        self._logger.addHandler(console_handler)
         
         # File handler if log file specified
         if self.log_file:
             file_handler = logging.FileHandler(self.log_file)
             file_handler.setLevel(logging.INFO)
             file_handler.setFormatter(formatter)
-            self.logger.addHandler(file_handler)
+            self._logger.addHandler(file_handler)
     
     def log_success(self, message: str):
         """Log successful operations"""
@@ -42,12 +393,13 @@ class DatabaseManager:
         """Log errors with user-friendly messages"""
         error_msg = message
         if error:
+            code = getattr(error, 'pgcode', None)
             # Hide technical details for user-friendly errors
-            if "password authentication failed" in str(error):
+            if code == '28P01' or "password authentication failed" in str(error):
                 error_msg = "Connection failed: Invalid username or password"
             elif "could not connect" in str(error):
                 error_msg = "Connection failed: Cannot connect to database server"
-            elif "duplicate key" in str(error):
+            elif code == '23505' or "duplicate key" in str(error):
                 error_msg = "Operation failed: Record with this value already exists"
             else:
                 # Generic error message for security
@@ -61,57 +413,551 @@ class DatabaseManager:
     def connect(self, host: str, port: str, database: str, 
                 username: str, password: str) -> bool:
         """Connect to PostgreSQL database"""
+        connect_kwargs = dict(
+            host=host,
+            port=port,
+            database=database,
+            user=username,
+            password=password
+        )
         try:
-            self.connection = psycopg2.connect(
-                host=host,
-                port=port,
-                database=database,
-                user=username,
-                password=password
-            )
-            self.connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-            self.cursor = self.connection.cursor(
+            if self.max_connections > 1:
+                minconn = max(1, min(self.min_connections, self.max_connections))
+                self.pool = ConnectionPool(minconn, self.max_connections, **connect_kwargs)
+                self._connection = self.pool.getconn(self.pool_timeout)
+            else:
+                self._connection = psycopg2.connect(**connect_kwargs)
+            # Autocommit outside of explicit transaction() units of work
+            self._connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            self._cursor = self._connection.cursor(
                 cursor_factory=psycopg2.extras.DictCursor
             )
-            self.log_success(f"Connected to database '{database}' as user '{username}'")
+            # Visible tables and columns depend on the connected role
+            self.catalog.invalidate()
+            if not self._sessions:
+                # Parked role sessions keep their prepared statements
+                self._prepared.clear()
+            self.username = username
+            self.target = (host, port, database)
+            mode = f" (pool {self.pool.minconn}-{self.pool.maxconn})" if self.pool else ""
+            self.log_success(f"Connected to database '{database}' as user '{username}'{mode}")
             return True
         except Exception as e:
             self.log_error("Failed to connect to database", e)
+            if self.pool:
+                self.pool.closeall()
+                self.pool = None
             return False
     
     def disconnect(self):
-        """Disconnect from database"""
-        if self.cursor:
-            self.cursor.close()
-        if self.connection:
-            self.connection.close()
+        """Disconnect from database, including parked role sessions"""
+        for username in list(self._sessions):
+            self._close_session(self._sessions.pop(username))
+        self._close_current()
+        self._prepared.clear()
+        self.username = None
+    
+    def _close_session(self, session: Dict[str, Any]):
+        """Close a parked session's cursor and pool or connection"""
+        if session['cursor'] and not session['cursor'].closed:
+            session['cursor'].close()
+        if session['pool']:
+            session['pool'].putconn(session['connection'])
+            session['pool'].closeall()
+        elif session['connection']:
+            session['connection'].close()
+    
+    def _close_current(self):
+        """Close the active session"""
+        if self._cursor and not self._cursor.closed:
+            self._cursor.close()
+        self._cursor = None
+        if self.pool:
+            if self._connection:
+                self.pool.putconn(self._connection)
+            self.pool.closeall()
+            self.pool = None
+            self._connection = None
             self.log_success("Disconnected from database")
+        elif self._connection:
+            self._connection.close()
+            self._connection = None
+            self.log_success("Disconnected from database")
+    
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None):
+        """Bind a pooled connection to the calling thread for the duration of the block"""
+        if self.pool is None or getattr(self._local, 'connection', None) is not None:
+            # Single-connection mode, or this thread already holds a connection
+            yield self.connection
+            return
+        
+        with self._bind(self.pool, timeout) as conn:
+            yield conn
+    
+    @contextmanager
+    def _bind(self, pool: ConnectionPool, timeout: Optional[float] = None):
+        """Check a connection out of pool and make it the calling thread's connection"""
+        conn = pool.getconn(self.pool_timeout if timeout is None else timeout)
+        try:
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            self._local.connection = conn
+            self._local.cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+            yield conn
+        finally:
+            cursor = getattr(self._local, 'cursor', None)
+            if cursor is not None and not cursor.closed:
+                cursor.close()
+            self._local.connection = None
+            self._local.cursor = None
+            pool.putconn(conn)
+    
+    def _park(self):
+        """Set the active session aside (connections stay open) for a later switch back"""
+        if self._connection is not None and self.username:
+            self._sessions[self.username] = {
+                'pool': self.pool, 'connection': self._connection,
+                'cursor': self._cursor, 'catalog': self.catalog,
+            }
+        self.pool = self._connection = self._cursor = None
+    
+    def _resume(self, username: str):
+        """Make a parked session the active one"""
+        session = self._sessions.pop(username)
+        self.pool = session['pool']
+        self._connection = session['connection']
+        self._cursor = session['cursor']
+        self.catalog = session['catalog']
+        self.username = username
+    
+    def switch_user(self, username: str, password: Optional[str] = None) -> bool:
+        """Make username the session user, reusing its warm session when there is one
+        
+        The previous session is parked with its pool, prepared statements and
+        schema catalog, so switching back costs no connect or authentication.
+        Only a role without a warm session is connected (to the current
+        host/port/database), which needs its password.
+        """
+        if username == self.username and self._connection is not None:
+            return True
+        if self.in_transaction:
+            self.log_error("Cannot switch user inside a transaction")
+            return False
+        
+        if username in self._sessions:
+            self._park()
+            self._resume(username)
+            self.log_success(f"Switched to user '{username}' (warm session)")
+            return True
+        
+        if self.target is None:
+            self.log_error("Cannot switch user before connecting")
+            return False
+        password = password if password is not None else self.role_credentials.get(username)
+        if password is None:
+            self.log_error(f"No warm session or password for user '{username}'")
+            return False
+        
+        previous = self.username
+        self._park()
+        self.catalog = SchemaCatalog(self.execute_query, ttl=self.catalog.ttl)
+        if self.connect(*self.target, username, password):
+            return True
+        if previous in self._sessions:
+            self._resume(previous)
+        return False
+    
+    def has_session(self, username: str) -> bool:
+        """True if username is the active or a parked session user"""
+        return username == self.username or username in self._sessions
     
-    def execute_query(self, query: str, params: Tuple = None) -> Optional[List[Dict]]:
-        """Execute a query and return results"""
+    def warm_roles(self, roles: Optional[Dict[str, str]] = None) -> List[str]:
+        """Open parked sessions for other roles (default: the [roles] config section)"""
+        current = self.username
+        warmed = []
+        for username, password in (roles or self.role_credentials).items():
+            if username == current or username in self._sessions:
+                continue
+            if self.switch_user(username, password):
+                warmed.append(username)
+        if current is not None and current != self.username:
+            self.switch_user(current)
+        return warmed
+    
+    @contextmanager
+    def role(self, username: str, timeout: Optional[float] = None):
+        """Run the block on a warm session of another role without switching the session user"""
+        session = self._sessions.get(username)
+        if username == self.username or getattr(self._local, 'connection', None) is not None:
+            yield self.connection
+        elif session is None:
+            raise ValueError(f"No warm session for user '{username}'")
+        elif session['pool'] is None:
+            self._local.connection = session['connection']
+            self._local.cursor = session['cursor']
+            try:
+                yield session['connection']
+            finally:
+                self._local.connection = None
+                self._local.cursor = None
+        else:
+            with self._bind(session['pool'], timeout) as conn:
+                yield conn
+    
+    def reporting(self):
+        """Context for read-only report queries: the report_role session when it is warm"""
+        if self.report_role and self.report_role in self._sessions:
+            return self.role(self.report_role)
+        return nullcontext()
+    
+    def pool_stats(self) -> Optional[Dict[str, Any]]:
+        """Pool usage and wait-time metrics, or None when not pooled"""
+        return self.pool.stats() if self.pool else None
+    
+    @contextmanager
+    def transaction(self, isolation_level: Optional[str] = None):
+        """Run the block as one unit of work with a single commit
+        
+        Statements inside the block are not committed individually; the whole
+        block commits on success and rolls back on any exception. Nested
+        transaction() blocks become savepoints.
+        """
+        if self.in_transaction:
+            with self.savepoint():
+                yield self.connection
+            return
+        
+        level = (isolation_level or self.isolation_level).upper()
+        if level not in self.ISOLATION_LEVELS:
+            raise ValueError(f"Invalid isolation level: {level}")
+        
+        conn = self.connection
+        conn.set_session(isolation_level=level, autocommit=False)
+        self._local.tx_depth = 1
+        try:
+            yield conn
+            if conn.info.transaction_status == TRANSACTION_STATUS_INERROR:
+                # A statement failed but its caller swallowed the error
+                raise psycopg2.DatabaseError("Transaction aborted by an earlier error")
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self._local.tx_depth = 0
+            if not conn.closed:
+                conn.set_session(isolation_level='DEFAULT', autocommit=True)
+    
+    @contextmanager
+    def savepoint(self, name: Optional[str] = None):
+        """Partial rollback point inside a transaction (starts one if needed)"""
+        if not self.in_transaction:
+            with self.transaction():
+                yield
+            return
+        
+        savepoint = sql.Identifier(name or f"sp_{next(self._savepoint_ids)}")
+        self.cursor.execute(sql.SQL("SAVEPOINT {}").format(savepoint))
+        self._local.tx_depth += 1
+        try:
+            yield
+            self.cursor.execute(sql.SQL("RELEASE SAVEPOINT {}").format(savepoint))
+        except Exception:
+            self.cursor.execute(sql.SQL("ROLLBACK TO SAVEPOINT {}").format(savepoint))
+            raise
+        finally:
+            self._local.tx_depth -= 1
+    
+    def run_in_transaction(self, work: Callable[[], Any],
+                           isolation_level: Optional[str] = None,
+                           retries: Optional[int] = None) -> Any:
+        """Call work() in a transaction, retrying on serialization failure or deadlock"""
+        if self.in_transaction:
+            # The outer unit of work owns retries
+            with self.savepoint():
+                return work()
+        
+        attempts = (self.transaction_retries if retries is None else retries) + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                with self.transaction(isolation_level):
+                    return work()
+            except TransactionRollbackError as e:
+                if attempt >= attempts:
+                    raise
+                self.logger.warning(f"Retrying transaction ({attempt}/{attempts - 1}): {e.pgcode}")
+                time.sleep(random.uniform(0, min(0.05 * 2 ** attempt, 1.0)))
+    
+    def _recover_session(self):
+        """Swap a dropped session connection for a fresh one from the pool"""
+        if self.pool is None or getattr(self._local, 'connection', None) is not None:
+            return
+        if self.in_transaction:
+            return
+        if self._connection is None or not self._connection.closed:
+            return
+        self._forget_prepared(self._connection)
+        self.pool.putconn(self._connection, close=True)
+        self._connection = self._cursor = None
+        try:
+            self._connection = self.pool.getconn(self.pool_timeout)
+            self._connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            self._cursor = self._connection.cursor(cursor_factory=psycopg2.extras.DictCursor)
+            self.log_success("Reconnected session from connection pool")
+        except Exception as e:
+            self.log_error("Failed to reconnect session", e)
+    
+    def execute_query(self, query: str, params: Tuple = None,
+                      analyze: Optional[bool] = None, shape: Optional[Tuple] = None) -> Optional[List[Dict]]:
+        """Execute a query and return results
+        
+        `analyze` says whether the slow-query log may re-run the statement under
+        EXPLAIN ANALYZE; by default only SELECTs are, so pass False for a SELECT
+        that calls a data-modifying function. `shape` keys the metrics instead
+        of the SQL text, for statements whose text varies per call (temp
+        table names).
+        """
+        started = time.perf_counter()
         try:
             self.cursor.execute(query, params or ())
-            if query.strip().upper().startswith(('SELECT', 'SHOW', 'DESC')):
-                results = self.cursor.fetchall()
-                return [dict(row) for row in results]
+            results = None
+            # Any statement producing rows returns them (incl. INSERT ... RETURNING)
+            if self.cursor.description is not None:
+                results = [dict(row) for row in self.cursor.fetchall()]
+            if (not query.strip().upper().startswith(('SELECT', 'SHOW', 'DESC'))
+                    and not self.in_transaction):
+                self.connection.commit()
+            self._observe(shape or query, started, results, statement=(query, params or ()),
+                          analyze=analyze)
+            return results
+        except Exception as e:
+            self._observe(shape or query, started, error=e)
+            self.log_error("Query execution failed", e)
+            if self.in_transaction:
+                raise
+            self._recover_session()
+            return None
+    
+    def execute_prepared(self, shape: Tuple, query, params: Tuple = None) -> Optional[List[Dict]]:
+        """Execute a QueryBuilder statement via PREPARE/EXECUTE, cached by statement shape
+        
+        `shape` identifies the SQL text (see QueryBuilder.*_shape); `query` is the
+        composed statement, only rendered the first time a connection sees it.
+        Returns fetched rows for statements that produce them (incl. RETURNING).
+        """
+        if self.prepared_cache_size <= 0:
+            text = query if isinstance(query, str) else query.as_string(self.cursor)
+            return self.execute_query(text, params)
+        
+        started = None
+        try:
+            name = self._prepare(shape, query)
+            params = tuple(params or ())
+            if params:
+                placeholders = ', '.join(['%s'] * len(params))
+                statement = f"EXECUTE {name} ({placeholders})"
             else:
+                statement = f"EXECUTE {name}"
+            started = time.perf_counter()
+            self.cursor.execute(statement, params or None)
+            
+            results = None
+            if self.cursor.description is not None:
+                results = [dict(row) for row in self.cursor.fetchall()]
+            if not self.in_transaction:
                 self.connection.commit()
-                return None
+            self._observe(shape, started, results, statement=(statement, params or None),
+                          analyze=shape[0] == 'select')
+            return results
         except Exception as e:
+            if started is not None:
+                self._observe(shape, started, error=e)
+            if getattr(e, 'pgcode', None) == '26000':
+                # Statement vanished server-side (DISCARD ALL etc.); rebuild next time
+                self._forget_prepared(self.connection)
             self.log_error("Query execution failed", e)
+            if self.in_transaction:
+                raise
+            self._recover_session()
             return None
     
+    def _prepare(self, shape: Tuple, query) -> str:
+        """Return the prepared statement name for shape, issuing PREPARE on a miss"""
+        conn = self.connection
+        key = (id(conn), conn.info.backend_pid)
+        with self._prepared_lock:
+            statements = self._prepared.setdefault(key, OrderedDict())
+            name = statements.get(shape)
+            if name is not None:
+                statements.move_to_end(shape)
+                self.prepared_hits += 1
+                return name
+            self.prepared_misses += 1
+            name = f"qb_stmt_{next(self._statement_ids)}"
+        
+        text = query if isinstance(query, str) else query.as_string(conn)
+        self.cursor.execute(f"PREPARE {name} AS {self._to_positional(text)}")
+        
+        evicted = None
+        with self._prepared_lock:
+            statements[shape] = name
+            if len(statements) > self.prepared_cache_size:
+                evicted = statements.popitem(last=False)[1]
+                self.prepared_evictions += 1
+        if evicted:
+            self.cursor.execute(f"DEALLOCATE {evicted}")
+        return name
+    
+    @staticmethod
+    def _to_positional(text: str) -> str:
+        """Convert psycopg2 %s placeholders into PREPARE-style $1, $2, ..."""
+        counter = itertools.count(1)
+        return re.sub(r'%([%s])',
+                      lambda m: '%' if m.group(1) == '%' else f"${next(counter)}",
+                      text)
+    
+    def _forget_prepared(self, conn):
+        """Drop cached statement names for a connection that is going away"""
+        if conn is None:
+            return
+        with self._prepared_lock:
+            for key in [k for k in self._prepared if k[0] == id(conn)]:
+                del self._prepared[key]
+    
+    def prepared_stats(self) -> Dict[str, int]:
+        """Prepared statement cache hit/miss counters"""
+        with self._prepared_lock:
+            return {
+                'hits': self.prepared_hits,
+                'misses': self.prepared_misses,
+                'evictions': self.prepared_evictions,
+                'cached': sum(len(stmts) for stmts in self._prepared.values()),
+                'capacity_per_connection': self.prepared_cache_size,
+            }
+    
+    def execute_copy(self, statement: str, file, shape=None) -> int:
+        """Run COPY ... FROM STDIN / TO STDOUT against a file-like object
+        
+        Returns the number of rows copied. Errors are logged and re-raised so
+        bulk callers can roll back their unit of work.
+        """
+        started = time.perf_counter()
+        try:
+            self.cursor.copy_expert(statement, file)
+            rowcount = self.cursor.rowcount
+            if not self.in_transaction:
+                self.connection.commit()
+        except Exception as e:
+            self._observe(shape or statement, started, error=e)
+            self.log_error("COPY failed", e)
+            raise
+        if self.metrics is not None:
+            self.metrics.record(shape or statement, time.perf_counter() - started, rows=max(rowcount, 0))
+        return rowcount
+    
+    def _observe(self, shape, started: float, rows: Optional[List[Dict]] = None,
+                 error: Optional[Exception] = None, statement: Optional[Tuple[str, Any]] = None,
+                 analyze: Optional[bool] = None):
+        """Record statement metrics and send slow statements to the slow-query log"""
+        if self.metrics is None:
+            return
+        elapsed = time.perf_counter() - started
+        error_code = None
+        if error is not None:
+            error_code = getattr(error, 'pgcode', None) or type(error).__name__
+        self.metrics.record(shape, elapsed,
+                            rows=len(rows) if rows else 0,
+                            nbytes=self._estimate_bytes(rows) if rows else 0,
+                            error_code=error_code)
+        
+        if (error is None and statement is not None and self.slow_query_ms > 0
+                and elapsed * 1000 >= self.slow_query_ms):
+            if analyze is None:
+                analyze = statement[0].lstrip().upper().startswith('SELECT')
+            self._log_slow_query(shape, elapsed, statement[0], statement[1], analyze)
+    
+    def _log_slow_query(self, shape, elapsed: float, statement: str, params, analyze: bool):
+        """Log a slow statement with its plan
+        
+        Only SELECTs are re-run under EXPLAIN (ANALYZE, BUFFERS); data-modifying
+        statements get a plain EXPLAIN so the slow-query log never repeats writes.
+        """
+        options = "ANALYZE, BUFFERS" if analyze else "COSTS"
+        try:
+            with self.savepoint() if self.in_transaction else nullcontext():
+                # Separate cursor so callers still see the original rowcount
+                with self.connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN ({options}) {statement}", params)
+                    plan = '\n'.join(row[0] for row in cursor.fetchall())
+            match = re.search(r'Execution Time: ([\d.]+) ms', plan)
+            if match:
+                self.metrics.record_server_time(shape, float(match.group(1)) / 1000)
+        except Exception as e:
+            plan = f"(plan unavailable: {e})"
+        
+        self.logger.warning(
+            f"🐢 SLOW QUERY ({elapsed * 1000:.1f} ms): {QueryMetrics.label(shape)}\n"
+            f"{statement}\n{plan}"
+        )
+    
+    @staticmethod
+    def _estimate_bytes(rows) -> int:
+        """Approximate result size from the text width of each value"""
+        return sum(len(str(value)) for row in rows for value in row.values()
+                   if value is not None)
+    
+    def stream_query(self, query: str, params: Tuple = None,
+                     itersize: Optional[int] = None) -> Iterator[Dict]:
+        """Yield rows of a read-only query lazily from a server-side cursor
+        
+        Only `itersize` rows are held in memory at a time. Named cursors need
+        a transaction, so in autocommit mode the stream runs in its own
+        READ ONLY transaction which is closed when the generator finishes
+        or is discarded. Inside a caller's transaction the stream joins it
+        as is.
+        """
+        conn = self.connection
+        own_transaction = conn.autocommit
+        if own_transaction:
+            was_readonly = conn.readonly
+            conn.autocommit = False
+            conn.readonly = True
+        try:
+            cursor_name = f"stream_{next(self._stream_ids)}"
+            with conn.cursor(name=cursor_name,
+                             cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.itersize = itersize or self.stream_itersize
+                started = time.perf_counter()
+                rows = nbytes = 0
+                try:
+                    cursor.execute(query, params or ())
+                    for row in cursor:
+                        rows += 1
+                        if self.metrics is not None:
+                            nbytes += self._estimate_bytes((row,))
+                        yield row
+                except Exception as e:
+                    self._observe(query, started, error=e)
+                    raise
+                # Includes time spent by the consumer between batches
+                if self.metrics is not None:
+                    self.metrics.record(query, time.perf_counter() - started, rows, nbytes)
+        finally:
+            if own_transaction and not conn.closed:
+                conn.rollback()
+                conn.readonly = was_readonly
+                conn.autocommit = True
+    
+    def refresh_schema(self):
+        """Force the schema catalog to reload (e.g. after DDL)"""
+        self.catalog.invalidate()
+        self.catalog.table_names()
+    
     def get_table_names(self) -> List[str]:
         """Get list of all tables in the database"""
         try:
-            query = """
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_schema = 'public'
-                ORDER BY table_name
-            """
-            tables = self.execute_query(query)
-            return [table['table_name'] for table in tables] if tables else []
+            return self.catalog.table_names()
         except Exception as e:
             self.log_error("Failed to get table names", e)
             return []
@@ -119,20 +965,55 @@ class DatabaseManager:
     def get_table_columns(self, table_name: str) -> List[str]:
         """Get column names for a specific table"""
         try:
-            query = """
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_schema = 'public' 
-                AND table_name = %s
-                ORDER BY ordinal_position
-            """
-            columns = self.execute_query(query, (table_name,))
-            return [col['column_name'] for col in columns] if columns else []
+            return self.catalog.columns(table_name)
         except Exception as e:
             self.log_error(f"Failed to get columns for table '{table_name}'", e)
             return []
     
+    def schema_overview(self, sample_rows: int = 0) -> Optional[List[Dict[str, Any]]]:
+        """Tables with columns, types, row estimates, sizes and indexes in one round trip
+        
+        With `sample_rows` each row also carries up to that many sample rows.
+        Tables and materialized views are read with TABLESAMPLE SYSTEM sized
+        to about SAMPLE_PAGES pages, so large tables are not scanned; views
+        just take the first rows. Tables the role cannot SELECT from are
+        listed without a sample.
+        """
+        samples = sql.SQL("")
+        sample_column = sql.SQL("NULL::json")
+        sample_join = sql.SQL("")
+        params: List[Any] = []
+        
+        # Privileges are checked when the statement is planned, so one unreadable
+        # table in the samples CTE would fail the whole overview
+        tables = ([t for t in self.get_table_names() if self.catalog.can_select(t)]
+                  if sample_rows > 0 else [])
+        if tables:
+            selects = []
+            for table in tables:
+                if self.catalog.kind(table) in ('r', 'p', 'm'):
+                    source = sql.SQL(
+                        "{} TABLESAMPLE SYSTEM ((SELECT LEAST(100, {} * 100.0 / GREATEST(sum(relpages), 1)) "
+                        "FROM pg_class WHERE oid = %s::regclass "
+                        "OR oid IN (SELECT relid FROM pg_partition_tree(%s::regclass))))"
+                    ).format(sql.Identifier(table), sql.Literal(self.SAMPLE_PAGES))
+                    params.extend([table, table])
+                else:
+                    source = sql.Identifier(table)
+                selects.append(sql.SQL(
+                    "SELECT {}::name, (SELECT json_agg(s) FROM (SELECT * FROM {} LIMIT {}) s)"
+                ).format(sql.Literal(table), source, sql.Literal(int(sample_rows))))
+            samples = sql.SQL("WITH samples (table_name, rows) AS ({})").format(
+                sql.SQL(" UNION ALL ").join(selects)
+            )
+            sample_column = sql.SQL("samples.rows")
+            sample_join = sql.SQL("LEFT JOIN samples ON samples.table_name = c.relname")
+        
+        query = sql.SQL(self.SCHEMA_OVERVIEW_QUERY).format(
+            samples=samples, sample_column=sample_column, sample_join=sample_join
+        )
+        return self.execute_query(query.as_string(self.cursor), tuple(params))
+    
     def validate_column_name(self, table_name: str, column_name: str) -> bool:
         """Validate that column exists in table (security measure)"""
-        valid_columns = self.get_table_columns(table_name)
-        return column_name in valid_columns
\ No newline at end of file
+        return self.catalog.has_column(table_name, column_name)
\ No newline at end of file
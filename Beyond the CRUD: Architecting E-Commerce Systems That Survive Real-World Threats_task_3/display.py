@@ -0,0 +1,40 @@
+"""
+Terminal rendering helpers, imported on first use
+
+colorama and tabulate are slow to import; headless runs (main.py --batch,
+server.py) that never render a table or colour should not pay for them.
+"""
+
+from typing import Any
+
+_colorama = None
+
+
+def _colors():
+    """colorama, initialised (autoreset) the first time a colour is used"""
+    global _colorama
+    if _colorama is None:
+        import colorama
+        colorama.init(autoreset=True)
+        _colorama = colorama
+    return _colorama
+
+
+class _LazyColors:
+    """Stand-in for colorama.Fore / colorama.Style"""
+    
+    def __init__(self, name: str):
+        self._name = name
+    
+    def __getattr__(self, attr: str) -> str:
+        return getattr(getattr(_colors(), self._name), attr)
+
+
+Fore = _LazyColors('Fore')
+Style = _LazyColors('Style')
+
+
+def tabulate(*args: Any, **kwargs: Any) -> str:
+    """tabulate.tabulate, imported on first call"""
+    from tabulate import tabulate as render
+    return render(*args, **kwargs)
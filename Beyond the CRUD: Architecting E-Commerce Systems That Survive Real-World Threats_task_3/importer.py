@@ -0,0 +1,269 @@
+import csv
+import os
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import List, Dict, Any, Optional, Iterator, Callable
+from security import QueryBuilder
+from operations import InventoryOperations
+
+
+class CsvImporter:
+    """File-driven bulk importer with column-wise validation
+    
+    The CSV is read in chunks; each column of a chunk is coerced and checked
+    with one converter (type, length, NOT NULL, CHECK range), uniqueness and
+    foreign keys are checked with one lookup per column per chunk, and the
+    surviving rows are streamed into InventoryOperations.bulk_load as a
+    single transaction. Rejected rows go to a reject file with the reason.
+    """
+    
+    TABLES = ('products', 'suppliers', 'categories')
+    
+    # Unique constraints that would abort a COPY if violated
+    UNIQUE_COLUMNS = {
+        'products': ('sku',),
+        'suppliers': ('email',),
+        'categories': ('category_name',),
+    }
+    
+    # Mirrors the CHECK constraints in 01_create_tables.sql: column -> (min, max)
+    CHECK_RANGES = {
+        'products': {'price': (0, None), 'cost': (0, None), 'quantity': (0, None)},
+    }
+    
+    def __init__(self, operations: InventoryOperations, chunk_size: int = 10000):
+        self.operations = operations
+        self.db = operations.db
+        self.chunk_size = chunk_size
+    
+    def import_file(self, table_name: str, path: str,
+                    reject_path: Optional[str] = None) -> Optional[Dict[str, int]]:
+        """Validate and load a CSV file with a header row into a table
+        
+        Returns {'read', 'loaded', 'rejected'} row counts, or None if the
+        file could not be loaded at all (nothing is committed in that case).
+        """
+        if table_name not in self.TABLES:
+            print(f"Error: CSV import is not supported for table '{table_name}'")
+            return None
+        
+        reject_path = reject_path or f"{os.path.splitext(path)[0]}.rejects.csv"
+        counts = {'read': 0, 'loaded': 0, 'rejected': 0}
+        
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                reader = csv.reader(f)
+                header = [name.strip().lower() for name in next(reader, [])]
+                if not self._check_header(table_name, header):
+                    return None
+                
+                with RejectWriter(reject_path, header) as rejects:
+                    records = self._valid_records(table_name, header, reader, rejects, counts)
+                    loaded = self.operations.bulk_load(table_name, records, columns=header,
+                                                       chunk_size=self.chunk_size)
+                    counts['rejected'] = rejects.count
+            
+            if loaded is None:
+                print(f"Import of '{path}' failed; no rows were committed")
+                return None
+            
+            counts['loaded'] = loaded
+            print(f"📥 Read {counts['read']} rows: loaded {counts['loaded']}, "
+                  f"rejected {counts['rejected']}"
+                  + (f" (see {reject_path})" if counts['rejected'] else ""))
+            return counts
+            
+        except (OSError, csv.Error, UnicodeDecodeError) as e:
+            print(f"Error reading CSV file: {str(e)}")
+            return None
+    
+    def _check_header(self, table_name: str, header: List[str]) -> bool:
+        """Header must name known, distinct, non-generated columns"""
+        if not header:
+            print("Error: CSV file is empty")
+            return False
+        if len(set(header)) != len(header):
+            print("Error: Duplicate column names in CSV header")
+            return False
+        key_column = QueryBuilder.primary_key(table_name)
+        for col in header:
+            if not QueryBuilder.validate_identifier(table_name, col):
+                print(f"Error: Unknown column '{col}' for table '{table_name}'")
+                return False
+            if col == key_column:
+                print(f"Error: '{col}' is generated and cannot be imported")
+                return False
+        return True
+    
+    def _valid_records(self, table_name: str, header: List[str], reader,
+                       rejects: 'RejectWriter', counts: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+        """Yield validated records chunk by chunk, sending failures to `rejects`"""
+        converters = {col: self._converter(table_name, col) for col in header}
+        seen = {col: set() for col in self.UNIQUE_COLUMNS.get(table_name, ()) if col in header}
+        
+        for chunk in self.operations._batches(reader, self.chunk_size):
+            counts['read'] += len(chunk)
+            errors: List[Optional[str]] = [None] * len(chunk)
+            for i, raw in enumerate(chunk):
+                if len(raw) != len(header):
+                    errors[i] = f"expected {len(header)} fields, got {len(raw)}"
+            
+            columns = {}
+            for position, col in enumerate(header):
+                columns[col] = self._convert_column(
+                    col, converters[col],
+                    [raw[position] if errors[i] is None else None for i, raw in enumerate(chunk)],
+                    errors
+                )
+            
+            for col, known in seen.items():
+                self._check_unique(table_name, col, columns[col], known, errors)
+            for col, (ref_table, ref_col) in self.db.catalog.foreign_keys(table_name).items():
+                if col in columns:
+                    self._check_references(col, ref_table, ref_col, columns[col], errors)
+            
+            for i, raw in enumerate(chunk):
+                if errors[i] is None:
+                    yield {col: columns[col][i] for col in header}
+                else:
+                    rejects.write(raw, errors[i])
+    
+    @staticmethod
+    def _convert_column(col: str, convert: Callable[[str], Any], values: List[Optional[str]],
+                        errors: List[Optional[str]]) -> List[Any]:
+        """Apply one converter down a column, recording the first error per row"""
+        converted = []
+        for i, raw in enumerate(values):
+            if errors[i] is not None:
+                converted.append(None)
+                continue
+            try:
+                converted.append(convert(raw.strip()))
+            except (ValueError, ArithmeticError) as e:
+                errors[i] = f"{col}: {e}"
+                converted.append(None)
+        return converted
+    
+    def _converter(self, table_name: str, col: str) -> Callable[[str], Any]:
+        """Build the coercion + validation function for one column"""
+        column_type = self.db.catalog.column_type(table_name, col) or 'text'
+        base, _, modifier = column_type.partition('(')
+        modifier = modifier.rstrip(')')
+        required = col in self.db.catalog.not_null(table_name)
+        low, high = self.CHECK_RANGES.get(table_name, {}).get(col, (None, None))
+        # Magnitude bound implied by numeric(precision, scale)
+        limit = None
+        
+        if base in ('smallint', 'integer', 'bigint'):
+            parse = int
+        elif base == 'numeric':
+            parse = Decimal
+            if modifier:
+                precision, _, scale = modifier.partition(',')
+                limit = Decimal(10) ** (int(precision) - int(scale or 0))
+        elif base in ('real', 'double precision'):
+            parse = float
+        elif base == 'date':
+            parse = date.fromisoformat
+        elif base.startswith('timestamp'):
+            parse = datetime.fromisoformat
+        elif base == 'boolean':
+            parse = self._parse_bool
+        else:
+            max_length = int(modifier) if base in ('character varying', 'character') and modifier else None
+            
+            def parse(text: str) -> str:
+                if max_length is not None and len(text) > max_length:
+                    raise ValueError(f"longer than {max_length} characters")
+                return text
+        
+        def convert(text: str) -> Any:
+            if text == '':
+                if required:
+                    raise ValueError("value is required")
+                return None
+            try:
+                value = parse(text)
+            except InvalidOperation:
+                raise ValueError(f"invalid number '{text}'")
+            if limit is not None and not -limit < value < limit:
+                raise ValueError(f"{value} exceeds {column_type}")
+            if low is not None and value < low:
+                raise ValueError(f"{value} is below {low}")
+            if high is not None and value > high:
+                raise ValueError(f"{value} is above {high}")
+            return value
+        
+        return convert
+    
+    @staticmethod
+    def _parse_bool(text: str) -> bool:
+        lowered = text.lower()
+        if lowered in ('t', 'true', 'y', 'yes', '1'):
+            return True
+        if lowered in ('f', 'false', 'n', 'no', '0'):
+            return False
+        raise ValueError(f"invalid boolean '{text}'")
+    
+    def _existing(self, table_name: str, col: str, values: List[Any]) -> set:
+        """Which of `values` already exist in table.col (one = ANY lookup)"""
+        if not values:
+            return set()
+        filters = [(col, 'IN', values)]
+        # Only the looked-up column, so unique / primary key indexes can answer it alone
+        shape = QueryBuilder.select_shape(table_name, filters, [col])
+        query = QueryBuilder.compile(
+            shape, lambda: QueryBuilder.build_select_query(table_name, filters, [col]), self.db.cursor
+        )
+        rows = self.db.execute_prepared(shape, query, tuple(QueryBuilder.filter_params(filters)))
+        if rows is None:
+            raise RuntimeError(f"Lookup on {table_name}.{col} failed")
+        return {row[col] for row in rows}
+    
+    def _check_unique(self, table_name: str, col: str, values: List[Any],
+                      known: set, errors: List[Optional[str]]):
+        """Reject duplicates within the file and values already in the table"""
+        candidates = {v for i, v in enumerate(values) if errors[i] is None and v is not None}
+        taken = self._existing(table_name, col, list(candidates - known))
+        for i, value in enumerate(values):
+            if errors[i] is not None or value is None:
+                continue
+            if value in known or value in taken:
+                errors[i] = f"{col}: duplicate value '{value}'"
+            else:
+                known.add(value)
+    
+    def _check_references(self, col: str, ref_table: str, ref_col: str,
+                          values: List[Any], errors: List[Optional[str]]):
+        """Reject rows whose foreign key has no parent row"""
+        candidates = {v for i, v in enumerate(values) if errors[i] is None and v is not None}
+        present = self._existing(ref_table, ref_col, list(candidates))
+        for i, value in enumerate(values):
+            if errors[i] is None and value is not None and value not in present:
+                errors[i] = f"{col}: no {ref_table} row with {ref_col} = {value}"
+
+
+class RejectWriter:
+    """CSV sink for rejected rows; the file is only created on the first reject"""
+    
+    def __init__(self, path: str, header: List[str]):
+        self.path = path
+        self.header = header
+        self.count = 0
+        self._file = None
+        self._writer = None
+    
+    def write(self, raw: List[str], reason: str):
+        if self._writer is None:
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.header + ['error'])
+        self._writer.writerow(list(raw) + [reason])
+        self.count += 1
+    
+    def __enter__(self) -> 'RejectWriter':
+        return self
+    
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Closed-loop load generator for server.py
+
+Each of --concurrency clients keeps one HTTP/1.1 connection open and sends
+requests back to back for --duration seconds; throughput, latency
+percentiles and status counts are printed at the end.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from metrics import LatencyHistogram
+
+
+async def client(host: str, port: int, request: bytes, deadline: float,
+                 histogram: LatencyHistogram, statuses: Dict[str, int]):
+    """One keep-alive connection issuing requests until the deadline"""
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            status = head.split(b' ', 2)[1].decode()
+            length = 0
+            for line in head.split(b'\r\n')[1:]:
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            histogram.record(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            if b'connection: close' in head.lower():
+                writer.close()
+                writer = None
+        except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+            statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def run(url: str, method: str, body: Optional[str], concurrency: int, duration: float):
+    target = urlsplit(url)
+    path = target.path or '/'
+    if target.query:
+        path += '?' + target.query
+    payload = (body or '').encode('utf-8')
+    request = (f"{method} {path} HTTP/1.1\r\nHost: {target.netloc}\r\n"
+               f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+               ).encode('latin-1') + payload
+    
+    histogram = LatencyHistogram()
+    statuses: Dict[str, int] = {}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        client(target.hostname, target.port or 80, request, deadline, histogram, statuses)
+        for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    
+    print(json.dumps({
+        'requests': histogram.count,
+        'seconds': round(elapsed, 2),
+        'requests_per_second': round(histogram.count / elapsed, 1),
+        'p50_ms': round(histogram.percentile(50) * 1000, 2),
+        'p95_ms': round(histogram.percentile(95) * 1000, 2),
+        'p99_ms': round(histogram.percentile(99) * 1000, 2),
+        'max_ms': round(histogram.max * 1000, 2),
+        'statuses': statuses,
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the inventory HTTP API")
+    parser.add_argument('--url', default='http://127.0.0.1:8080/products/1')
+    parser.add_argument('--method', default='GET')
+    parser.add_argument('--body', help="JSON request body (for POST endpoints)")
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.method.upper(), args.body, args.concurrency, args.duration))
+
+
+if __name__ == "__main__":
+    main()
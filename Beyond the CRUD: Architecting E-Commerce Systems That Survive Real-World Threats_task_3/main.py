@@ -6,26 +6,40 @@ Database CRUD Operations with Docker Support
 
 import sys
 import os
-from colorama import init, Fore, Style
-from tabulate import tabulate
+import argparse
+from configparser import ConfigParser
 from getpass import getpass
-from typing import Optional
-
-# Initialize colorama for colored output
-init(autoreset=True)
+from typing import List, Optional, Tuple
 
 # Add app directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import DatabaseManager
-from operations import InventoryOperations
-from security import QueryBuilder
+# colorama/tabulate load on first use; database modules (psycopg2) and feature
+# modules are imported where they are used, so --help and argument errors stay cheap
+from display import Fore, Style, tabulate
+
+def load_config(config_file: Optional[str] = None) -> ConfigParser:
+    """Load application settings (pool size etc.) from an INI file if present"""
+    config = ConfigParser()
+    if config_file and not config.read(config_file):
+        print(Fore.YELLOW + f"Config file '{config_file}' not found, using defaults")
+    return config
+
 
 class InventoryCLI:
-    def __init__(self, log_file: Optional[str] = None):
-        self.db_manager = DatabaseManager(log_file)
+    def __init__(self, log_file: Optional[str] = None, config: Optional[ConfigParser] = None):
+        from database import DatabaseManager
+        
+        self.db_manager = DatabaseManager(log_file, config)
+        self.page_size = (config or ConfigParser()).getint('application', 'page_size', fallback=20)
         self.operations = None
         self.current_user = None
+    
+    def open_operations(self):
+        """Bind the operations layer to the current connection"""
+        from operations import InventoryOperations
+        
+        self.operations = InventoryOperations(self.db_manager)
         
     def print_header(self):
         """Print application header"""
@@ -48,6 +62,13 @@ class InventoryCLI:
         print("8.  🗃️  Insert Multiple Records")
         print("9.  📋 Show Database Schema")
         print("10. 🔄 Switch User")
+        print("11. 📈 Query Metrics")
+        print("12. 📦 Record Stock Movement")
+        print("13. 💾 Export Table")
+        print("14. 📥 Import CSV File")
+        print("15. 📊 Reports")
+        print("16. 🗂️  Ledger Partitions")
+        print("17. 🧭 Index Advisor")
         print("0.  🚪 Exit")
         print(Fore.CYAN + "-" * 80)
     
@@ -70,30 +91,64 @@ class InventoryCLI:
         host, port, database, username, password = self.get_database_credentials()
         
         if self.db_manager.connect(host, port, database, username, password):
-            self.operations = InventoryOperations(self.db_manager)
+            self.open_operations()
             self.current_user = username
             print(Fore.GREEN + f"\n✅ Connected as user: {username}")
+            warmed = self.db_manager.warm_roles()
+            if warmed:
+                print(Fore.GREEN + f"🔥 Warm sessions ready for: {', '.join(warmed)}")
             return True
         return False
     
+    def run_batch(self, job_path: str, credentials: Tuple[str, str, str, str, str],
+                  report_path: Optional[str] = None) -> bool:
+        """Run a job file (or '-' for a JSON Lines stream on stdin) without prompts"""
+        from batch import BatchRunner
+        
+        if not self.db_manager.connect(*credentials):
+            return False
+        self.open_operations()
+        self.current_user = credentials[3]
+        try:
+            runner = BatchRunner(self.db_manager, self.operations)
+            ok = runner.run_job(job_path)
+            if report_path:
+                runner.write_report(report_path)
+            return ok
+        finally:
+            self.db_manager.disconnect()
+    
     def show_database_schema(self):
         """Display database schema and table information"""
-        tables = self.db_manager.get_table_names()
+        sample = input("Include sample rows? (y/n): ").strip().lower() == 'y'
+        tables = self.db_manager.schema_overview(sample_rows=3 if sample else 0)
         
         print(Fore.CYAN + "\n📊 DATABASE SCHEMA")
         print("-" * 60)
         
+        if tables is None:
+            print(Fore.RED + "Failed to read the schema")
+            return
+        
+        print(tabulate(
+            [{'table': t['table_name'], 'kind': t['kind'],
+              'rows (est.)': '?' if t['row_estimate'] is None else t['row_estimate'],
+              'size': t['total_size'], 'columns': len(t['columns'] or []),
+              'indexes': len(t['indexes'] or [])} for t in tables],
+            headers="keys", tablefmt="simple"
+        ))
+        
         for table in tables:
-            columns = self.db_manager.get_table_columns(table)
-            print(Fore.YELLOW + f"\n📋 Table: {table}")
-            print(Fore.WHITE + f"Columns: {', '.join(columns)}")
-            
-            # Show sample data
-            query = f"SELECT * FROM {table} LIMIT 3"
-            results = self.db_manager.execute_query(query)
-            if results:
-                print(Fore.GREEN + f"Sample data (first 3 rows):")
-                print(tabulate(results, headers="keys", tablefmt="simple"))
+            print(Fore.YELLOW + f"\n📋 Table: {table['table_name']}")
+            print(Fore.WHITE + "Columns: " + ', '.join(
+                f"{c['name']} {c['type']}" + (" NOT NULL" if c['not_null'] else "")
+                for c in table['columns'] or []
+            ))
+            if table['indexes']:
+                print(Fore.WHITE + "Indexes: " + '; '.join(table['indexes']))
+            if table['sample']:
+                print(Fore.GREEN + f"Sample rows ({len(table['sample'])}):")
+                print(tabulate(table['sample'], headers="keys", tablefmt="simple"))
     
     def view_tables_menu(self):
         """Menu for viewing tables"""
@@ -114,12 +169,70 @@ class InventoryCLI:
         try:
             table_idx = int(choice) - 1
             if 0 <= table_idx < len(tables):
-                self.operations.display_table(tables[table_idx])
+                mode = input("Browse page by page (Enter) or show all rows (a)? ").strip().lower()
+                if mode == 'a':
+                    self.operations.display_table(tables[table_idx])
+                else:
+                    self.browse_table(tables[table_idx])
             else:
                 print(Fore.RED + "Invalid selection")
         except ValueError:
             print(Fore.RED + "Please enter a valid number")
     
+    def browse_table(self, table_name: str):
+        """Keyset-paginated table browser with next/previous navigation"""
+        from security import QueryBuilder
+        
+        try:
+            key_column = QueryBuilder.primary_key(table_name)
+        except ValueError:
+            print(Fore.YELLOW + f"'{table_name}' has no single-column key; showing all rows")
+            self.operations.display_table(table_name)
+            return
+        page_size = self.page_size
+        page_number = 1
+        rows = self.operations.fetch_page(table_name, page_size=page_size)
+        
+        if not rows:
+            print(f"No records found in table '{table_name}'")
+            return
+        
+        while True:
+            self.operations.display_page(table_name, rows, page_number)
+            action = input(Fore.CYAN + "[n]ext, [p]revious, [s]ize, [q]uit: ").strip().lower()
+            
+            if action in ('q', '0', ''):
+                break
+            elif action == 'n':
+                page = self.operations.fetch_page(
+                    table_name, after=rows[-1][key_column], page_size=page_size
+                )
+                if page:
+                    rows, page_number = page, page_number + 1
+                else:
+                    print(Fore.YELLOW + "Already at the last page")
+            elif action == 'p':
+                page = self.operations.fetch_page(
+                    table_name, before=rows[0][key_column], page_size=page_size
+                )
+                if page:
+                    rows, page_number = page, max(1, page_number - 1)
+                else:
+                    print(Fore.YELLOW + "Already at the first page")
+            elif action == 's':
+                try:
+                    new_size = int(input("Rows per page: ").strip())
+                    if new_size <= 0:
+                        raise ValueError
+                    page_size = self.page_size = new_size
+                    # Page numbers change with the size, so restart from the top
+                    rows = self.operations.fetch_page(table_name, page_size=page_size)
+                    page_number = 1
+                except ValueError:
+                    print(Fore.RED + "Please enter a positive number")
+            else:
+                print(Fore.RED + "Invalid choice")
+    
     def filter_single_value_menu(self):
         """Menu for single value filtering"""
         tables = self.db_manager.get_table_names()
@@ -172,6 +285,66 @@ class InventoryCLI:
         except ValueError:
             print(Fore.RED + "Please enter valid numbers")
     
+    def _prompt_filters(self, columns: List[str]) -> List[tuple]:
+        """Ask for filter conditions until an empty column choice; raises ValueError on bad numbers"""
+        filters = []
+        print(Fore.YELLOW + "\nEnter filter conditions (enter empty when done):")
+        
+        while True:
+            # Show columns
+            print(Fore.WHITE + "\nAvailable columns:")
+            for i, col in enumerate(columns, 1):
+                print(f"{i}. {col}")
+            
+            col_choice = input("\nSelect column (or press Enter to finish): ").strip()
+            if not col_choice:
+                break
+            
+            col_idx = int(col_choice) - 1
+            if not (0 <= col_idx < len(columns)):
+                print(Fore.RED + "Invalid column selection")
+                continue
+            
+            column_name = columns[col_idx]
+            
+            print(Fore.WHITE + "\nAvailable operators: =, !=, >, <, >=, <=, LIKE, IN")
+            operator = input("Enter operator: ").strip().upper()
+            
+            if operator == 'IN':
+                values = input("Enter comma-separated values: ").strip().split(',')
+                values = [v.strip() for v in values]
+                
+                # Convert numeric values
+                if column_name.endswith('_id') or column_name in ['quantity', 'price', 'cost']:
+                    converted_values = []
+                    for v in values:
+                        try:
+                            if '.' in v:
+                                converted_values.append(float(v))
+                            else:
+                                converted_values.append(int(v))
+                        except ValueError:
+                            converted_values.append(v)
+                    values = converted_values
+                
+                filters.append((column_name, operator, values))
+            else:
+                value = input(f"Enter value for {column_name}: ").strip()
+                
+                # Convert numeric values
+                if column_name.endswith('_id') or column_name in ['quantity', 'price', 'cost']:
+                    try:
+                        if '.' in value:
+                            value = float(value)
+                        else:
+                            value = int(value)
+                    except ValueError:
+                        pass
+                
+                filters.append((column_name, operator, value))
+        
+        return filters
+    
     def filter_multiple_values_menu(self):
         """Menu for multiple values filtering"""
         tables = self.db_manager.get_table_names()
@@ -194,64 +367,19 @@ class InventoryCLI:
             table_name = tables[table_idx]
             columns = self.db_manager.get_table_columns(table_name)
             
-            filters = []
-            print(Fore.YELLOW + "\nEnter filter conditions (enter empty when done):")
-            
-            while True:
-                # Show columns
-                print(Fore.WHITE + "\nAvailable columns:")
-                for i, col in enumerate(columns, 1):
-                    print(f"{i}. {col}")
-                
-                col_choice = input("\nSelect column (or press Enter to finish): ").strip()
-                if not col_choice:
-                    break
-                
-                col_idx = int(col_choice) - 1
-                if not (0 <= col_idx < len(columns)):
-                    print(Fore.RED + "Invalid column selection")
-                    continue
-                
-                column_name = columns[col_idx]
-                
-                print(Fore.WHITE + "\nAvailable operators: =, !=, >, <, >=, <=, LIKE, IN")
-                operator = input("Enter operator: ").strip().upper()
-                
-                if operator == 'IN':
-                    values = input("Enter comma-separated values: ").strip().split(',')
-                    values = [v.strip() for v in values]
-                    
-                    # Convert numeric values
-                    if column_name.endswith('_id') or column_name in ['quantity', 'price', 'cost']:
-                        converted_values = []
-                        for v in values:
-                            try:
-                                if '.' in v:
-                                    converted_values.append(float(v))
-                                else:
-                                    converted_values.append(int(v))
-                            except ValueError:
-                                converted_values.append(v)
-                        values = converted_values
-                    
-                    filters.append((column_name, operator, values))
-                else:
-                    value = input(f"Enter value for {column_name}: ").strip()
-                    
-                    # Convert numeric values
-                    if column_name.endswith('_id') or column_name in ['quantity', 'price', 'cost']:
-                        try:
-                            if '.' in value:
-                                value = float(value)
-                            else:
-                                value = int(value)
-                        except ValueError:
-                            pass
-                    
-                    filters.append((column_name, operator, value))
+            filters = self._prompt_filters(columns)
             
             if filters:
-                self.operations.filter_multiple_values(table_name, filters)
+                projection = input("Columns to show (comma-separated, Enter for all): ").strip()
+                order = input("Sort by column (prefix '-' for descending, Enter for none): ").strip()
+                limit = input("Maximum rows (Enter for all): ").strip()
+                
+                self.operations.filter_multiple_values(
+                    table_name, filters,
+                    columns=[c.strip() for c in projection.split(',') if c.strip()] or None,
+                    order_by=[(order.lstrip('-'), 'DESC' if order.startswith('-') else 'ASC')] if order else None,
+                    limit=int(limit) if limit else None
+                )
             else:
                 print(Fore.YELLOW + "No filters specified")
                 
@@ -260,7 +388,9 @@ class InventoryCLI:
     
     def update_single_record_menu(self):
         """Menu for updating single record"""
-        tables = self.db_manager.get_table_names()
+        from security import QueryBuilder
+        
+        tables = [t for t in self.db_manager.get_table_names() if QueryBuilder.validate_writable(t)]
         
         print(Fore.CYAN + "\n✏️ UPDATE SINGLE RECORD")
         print("-" * 40)
@@ -281,7 +411,7 @@ class InventoryCLI:
             columns = self.db_manager.get_table_columns(table_name)
             
             # Get record ID
-            id_column = f"{table_name[:-1]}_id" if table_name.endswith('s') else f"{table_name}_id"
+            id_column = QueryBuilder.primary_key(table_name)
             record_id = input(f"\nEnter {id_column} to update: ").strip()
             
             # Convert to appropriate type
@@ -386,6 +516,27 @@ class InventoryCLI:
             elif choice == '10':
                 self.switch_user_menu()
             
+            elif choice == '11':
+                self.query_metrics_menu()
+            
+            elif choice == '12':
+                self.stock_movement_menu()
+            
+            elif choice == '13':
+                self.export_table_menu()
+            
+            elif choice == '14':
+                self.import_csv_menu()
+            
+            elif choice == '15':
+                self.reports_menu()
+            
+            elif choice == '16':
+                self.ledger_partitions_menu()
+            
+            elif choice == '17':
+                self.index_advisor_menu()
+            
             else:
                 print(Fore.RED + "Invalid choice. Please try again.")
             
@@ -395,7 +546,9 @@ class InventoryCLI:
     
     def update_multiple_records_menu(self):
         """Menu for updating multiple records"""
-        tables = self.db_manager.get_table_names()
+        from security import QueryBuilder
+        
+        tables = [t for t in self.db_manager.get_table_names() if QueryBuilder.validate_writable(t)]
         
         print(Fore.CYAN + "\n📝 UPDATE MULTIPLE RECORDS")
         print("-" * 40)
@@ -484,7 +637,9 @@ class InventoryCLI:
     
     def insert_single_record_menu(self):
         """Menu for inserting single record"""
-        tables = self.db_manager.get_table_names()
+        from security import QueryBuilder
+        
+        tables = [t for t in self.db_manager.get_table_names() if QueryBuilder.validate_writable(t)]
         
         print(Fore.CYAN + "\n➕ INSERT SINGLE RECORD")
         print("-" * 40)
@@ -581,7 +736,9 @@ class InventoryCLI:
     
     def insert_multiple_records_menu(self):
         """Menu for inserting multiple records"""
-        tables = self.db_manager.get_table_names()
+        from security import QueryBuilder
+        
+        tables = [t for t in self.db_manager.get_table_names() if QueryBuilder.validate_writable(t)]
         
         print(Fore.CYAN + "\n🗃️ INSERT MULTIPLE RECORDS")
         print("-" * 40)
@@ -650,6 +807,207 @@ class InventoryCLI:
         except ValueError:
             print(Fore.RED + "Please enter valid numbers")
     
+    def stock_movement_menu(self):
+        """Menu for recording a stock movement"""
+        print(Fore.CYAN + "\n📦 RECORD STOCK MOVEMENT")
+        print("-" * 40)
+        
+        types = list(self.operations.MOVEMENT_SIGNS)
+        for i, movement_type in enumerate(types, 1):
+            print(f"{i}. {movement_type}")
+        
+        try:
+            type_idx = int(input("\nSelect movement type: ").strip()) - 1
+            if not (0 <= type_idx < len(types)):
+                print(Fore.RED + "Invalid movement type")
+                return
+            
+            product_id = int(input("Enter product_id: ").strip())
+            quantity = int(input("Enter quantity (signed for ADJUSTMENT): ").strip())
+            reference = input("Reference (optional): ").strip() or None
+            notes = input("Notes (optional): ").strip() or None
+            
+            self.operations.record_stock_movement(
+                product_id, types[type_idx], quantity,
+                reference=reference, notes=notes, created_by=self.current_user
+            )
+        except ValueError:
+            print(Fore.RED + "Please enter valid numbers")
+    
+    def export_table_menu(self):
+        """Menu for exporting a table (optionally filtered) to a file"""
+        tables = self.db_manager.get_table_names()
+        
+        print(Fore.CYAN + "\n💾 EXPORT TABLE")
+        print("-" * 40)
+        
+        for i, table in enumerate(tables, 1):
+            print(f"{i}. {table}")
+        
+        try:
+            table_idx = int(input("\nSelect table: ").strip()) - 1
+            if not (0 <= table_idx < len(tables)):
+                print(Fore.RED + "Invalid table selection")
+                return
+            
+            table_name = tables[table_idx]
+            filters = []
+            if input("Filter rows? (y/n): ").strip().lower() == 'y':
+                filters = self._prompt_filters(self.db_manager.get_table_columns(table_name))
+            
+            formats = self.operations.EXPORT_FORMATS
+            fmt = input(f"Format ({'/'.join(formats)}) [csv]: ").strip().lower() or 'csv'
+            if fmt not in formats:
+                print(Fore.RED + "Invalid format")
+                return
+            
+            compress = input("Compress with gzip? (y/n): ").strip().lower() == 'y'
+            default_path = f"{table_name}.{fmt}" + ('.gz' if compress and fmt != 'parquet' else '')
+            path = input(f"Output file [{default_path}]: ").strip() or default_path
+            
+            self.operations.export_table(table_name, path, fmt, filters, compress)
+            
+        except ValueError:
+            print(Fore.RED + "Please enter valid numbers")
+    
+    def import_csv_menu(self):
+        """Menu for validating and bulk loading a CSV file"""
+        from importer import CsvImporter
+        
+        print(Fore.CYAN + "\n📥 IMPORT CSV FILE")
+        print("-" * 40)
+        
+        tables = list(CsvImporter.TABLES)
+        for i, table in enumerate(tables, 1):
+            print(f"{i}. {table}")
+        
+        try:
+            table_idx = int(input("\nSelect table: ").strip()) - 1
+            if not (0 <= table_idx < len(tables)):
+                print(Fore.RED + "Invalid table selection")
+                return
+        except ValueError:
+            print(Fore.RED + "Please enter a valid number")
+            return
+        
+        path = input("CSV file (with header row): ").strip()
+        if not path:
+            return
+        reject_path = input("Reject file (Enter for default): ").strip() or None
+        
+        CsvImporter(self.operations).import_file(tables[table_idx], path, reject_path)
+    
+    def reports_menu(self):
+        """Menu for the canned inventory reports"""
+        print(Fore.CYAN + "\n📊 REPORTS")
+        print("-" * 40)
+        
+        names = list(self.operations.REPORTS)
+        for i, name in enumerate(names, 1):
+            print(f"{i}. {self.operations.REPORTS[name]['title']}")
+        print("r. Rebuild all rollups")
+        
+        try:
+            choice = input("\nSelect report: ").strip().lower()
+            if choice == 'r':
+                self.operations.refresh_rollups(force=True)
+                return
+            report_idx = int(choice) - 1
+            if not (0 <= report_idx < len(names)):
+                print(Fore.RED + "Invalid report selection")
+                return
+            limit = input("Maximum rows (Enter for all): ").strip()
+            self.operations.run_report(names[report_idx], limit=int(limit) if limit else None)
+        except ValueError:
+            print(Fore.RED + "Please enter valid numbers")
+    
+    def ledger_partitions_menu(self):
+        """Show ledger partitions and run partition maintenance"""
+        print(Fore.CYAN + "\n🗂️ LEDGER PARTITIONS")
+        print("-" * 40)
+        
+        partitions = self.operations.ledger_partitions()
+        if partitions:
+            print(tabulate(partitions, headers="keys", tablefmt="simple"))
+        
+        if input("\nRun maintenance? (y/n): ").strip().lower() != 'y':
+            return
+        try:
+            months_ahead = int(input("Months to pre-create [3]: ").strip() or 3)
+            retain = input("Months to keep (Enter to keep all): ").strip()
+            retain_months = int(retain) if retain else None
+        except ValueError:
+            print(Fore.RED + "Please enter valid numbers")
+            return
+        
+        archive_dir = None
+        if retain_months is not None:
+            archive_dir = input("Archive directory (Enter to detach without dropping): ").strip() or None
+            if archive_dir and input(Fore.YELLOW + "Old partitions will be dropped after archiving. "
+                                     "Continue? (y/n): ").strip().lower() != 'y':
+                return
+        
+        self.operations.maintain_partitions(months_ahead, retain_months, archive_dir)
+    
+    def index_advisor_menu(self):
+        """Suggest indexes for the filters used this session and optionally build them"""
+        from advisor import IndexAdvisor
+        
+        print(Fore.CYAN + "\n🧭 INDEX ADVISOR")
+        print("-" * 40)
+        
+        advisor = IndexAdvisor(self.db_manager)
+        recommendations = advisor.advise()
+        if not recommendations:
+            return
+        if input(Fore.YELLOW + "\nCreate these indexes concurrently? (y/n): ").strip().lower() == 'y':
+            created = advisor.create(recommendations)
+            print(Fore.GREEN + f"✅ {created}/{len(recommendations)} indexes created")
+    
+    def query_metrics_menu(self):
+        """Show per-statement latency metrics and optionally export them"""
+        from security import QueryBuilder
+        
+        print(Fore.CYAN + "\n📈 QUERY METRICS")
+        print("-" * 40)
+        
+        metrics = self.db_manager.metrics
+        if metrics is None:
+            print(Fore.YELLOW + "Query metrics are disabled ([application] query_metrics)")
+            return
+        
+        snapshot = metrics.snapshot()
+        if snapshot:
+            rows = [
+                {'statement': label[:60], 'calls': s['calls'],
+                 'p50 ms': round(s['p50_ms'], 2), 'p95 ms': round(s['p95_ms'], 2),
+                 'p99 ms': round(s['p99_ms'], 2), 'max ms': round(s['max_ms'], 2),
+                 'rows': s['rows'], 'errors': sum(s['errors'].values())}
+                for label, s in sorted(snapshot.items(), key=lambda item: -item[1]['total_ms'])
+            ]
+            print(tabulate(rows, headers="keys", tablefmt="simple"))
+        else:
+            print(Fore.YELLOW + "No statements recorded yet")
+        
+        print(Fore.WHITE + f"\nPrepared statements: {self.db_manager.prepared_stats()}")
+        print(Fore.WHITE + f"Compiled SQL cache: {QueryBuilder.compiled_stats()}")
+        pool_stats = self.db_manager.pool_stats()
+        if pool_stats:
+            print(Fore.WHITE + f"Connection pool: {pool_stats}")
+        
+        export_format = input("\nExport format (json/prometheus, Enter to skip): ").strip().lower()
+        if export_format not in ('json', 'prometheus'):
+            return
+        path = input("Output file: ").strip()
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(metrics.to_json() if export_format == 'json' else metrics.to_prometheus())
+            print(Fore.GREEN + f"✅ Metrics written to {path}")
+        except OSError as e:
+            print(Fore.RED + f"Could not write metrics: {e}")
+    
     def switch_user_menu(self):
         """Menu for switching database user"""
         print(Fore.CYAN + "\n🔄 SWITCH USER")
@@ -674,37 +1032,67 @@ class InventoryCLI:
             password = 'admin_pass789'
         elif choice == '4':
             username = input("Enter username: ").strip()
-            password = getpass("Enter password: ").strip()
+            password = None
         else:
             print(Fore.RED + "Invalid choice")
             return
         
-        # Disconnect and reconnect with new credentials
-        self.db_manager.disconnect()
-        
-        # Get current connection details
-        host = "localhost"  # Default for Docker
-        port = "5432"
-        database = "ecommerce_db"
+        # Configured credentials win over the built-in defaults
+        password = self.db_manager.role_credentials.get(username, password)
+        if password is None and not self.db_manager.has_session(username):
+            password = getpass("Enter password: ").strip()
         
-        if self.db_manager.connect(host, port, database, username, password):
-            self.operations = InventoryOperations(self.db_manager)
+        # Warm sessions are reused; new ones connect to the current host/database
+        if self.db_manager.switch_user(username, password):
+            self.open_operations()
             self.current_user = username
             print(Fore.GREEN + f"\n✅ Switched to user: {username}")
         else:
             print(Fore.RED + "\n❌ Failed to switch user")
 
 
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Command-line options; without --batch the interactive menu runs"""
+    parser = argparse.ArgumentParser(description="E-Commerce Inventory Management System")
+    parser.add_argument('--batch', metavar='JOB',
+                        help="run a JSON/YAML job file, or '-' for JSON Lines steps on stdin")
+    parser.add_argument('--report', metavar='PATH', help="write per-step batch timings as JSON")
+    parser.add_argument('--host', help="database host (default: [database] host or localhost)")
+    parser.add_argument('--port', help="database port (default: [database] port or 5432)")
+    parser.add_argument('--database', help="database name (default: [database] database)")
+    parser.add_argument('--user', help="database user (default: [database] username)")
+    return parser.parse_args(argv)
+
+
+def batch_credentials(args: argparse.Namespace, config: ConfigParser) -> Tuple[str, str, str, str, str]:
+    """Connection settings for batch mode; the password comes from APP_DB_PASSWORD or the config"""
+    return (
+        args.host or config.get('database', 'host', fallback='localhost'),
+        args.port or config.get('database', 'port', fallback='5432'),
+        args.database or config.get('database', 'database', fallback='ecommerce_db'),
+        args.user or config.get('database', 'username',
+                                fallback=config.get('application', 'default_user', fallback='app_user')),
+        os.getenv('APP_DB_PASSWORD') or config.get('database', 'password', fallback=''),
+    )
+
+
 def main():
     """Main entry point"""
+    args = parse_args()
+    
     # Check if log file path is provided via environment variable
     log_file = os.getenv('APP_LOG_FILE')
     
     if log_file:
         print(f"📝 Logging to file: {log_file}")
     
+    config = load_config(os.getenv('APP_CONFIG_FILE'))
+    
     try:
-        cli = InventoryCLI(log_file)
+        cli = InventoryCLI(log_file, config)
+        if args.batch:
+            ok = cli.run_batch(args.batch, batch_credentials(args, config), args.report)
+            sys.exit(0 if ok else 1)
         cli.run()
     except KeyboardInterrupt:
         print(Fore.YELLOW + "\n\n👋 Interrupted by user. Goodbye!")
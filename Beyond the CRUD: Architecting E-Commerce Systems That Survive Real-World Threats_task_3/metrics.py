@@ -0,0 +1,207 @@
+import json
+import math
+import threading
+from typing import Optional, List, Tuple, Dict, Any
+
+
+class LatencyHistogram:
+    """Log-linear (HDR-style) latency histogram with bounded relative error"""
+    
+    # Linear sub-buckets per power of two of microseconds (~6% relative error)
+    SUB_BUCKETS = 16
+    
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max = 0.0
+    
+    @classmethod
+    def _index(cls, micros: float) -> int:
+        """Bucket index of a latency in microseconds (0 holds sub-microsecond values)"""
+        if micros < 1:
+            return 0
+        exponent = int(math.log2(micros))
+        sub = int((micros / 2 ** exponent - 1) * cls.SUB_BUCKETS)
+        return exponent * cls.SUB_BUCKETS + min(sub, cls.SUB_BUCKETS - 1) + 1
+    
+    @classmethod
+    def _upper_bound(cls, index: int) -> float:
+        """Upper bound of a bucket in microseconds"""
+        if index == 0:
+            return 1.0
+        exponent, sub = divmod(index - 1, cls.SUB_BUCKETS)
+        return 2 ** exponent * (1 + (sub + 1) / cls.SUB_BUCKETS)
+    
+    def record(self, seconds: float):
+        """Add one observation"""
+        index = self._index(seconds * 1e6)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = max(self.max, seconds)
+    
+    def percentile(self, pct: float) -> float:
+        """Latency in seconds below which pct percent of observations fall"""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * pct / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._upper_bound(index) / 1e6, self.max)
+        return self.max
+    
+    def count_at_or_below(self, seconds: float) -> int:
+        """Cumulative count for a fixed bound (used for Prometheus buckets)"""
+        micros = seconds * 1e6
+        return sum(count for index, count in self.counts.items()
+                   if self._upper_bound(index) <= micros)
+
+
+class QueryMetrics:
+    """Per statement-shape latency, row, byte and error counters"""
+    
+    # Fixed bucket bounds (seconds) used for the Prometheus exposition
+    PROMETHEUS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                          0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def label(shape) -> str:
+        """Readable statement key: QueryBuilder shape tuples or normalised SQL text"""
+        if isinstance(shape, tuple):
+            parts = []
+            for part in shape:
+                if isinstance(part, tuple):
+                    parts.append(','.join(
+                        ''.join(map(str, p[:2])) if isinstance(p, tuple) else str(p)
+                        for p in part
+                    ) or '-')
+                else:
+                    parts.append(str(part))
+            return ' '.join(parts)
+        return ' '.join(str(shape).split())[:200]
+    
+    def _entry(self, shape) -> Dict[str, Any]:
+        """Stats record for a shape (caller holds the lock)"""
+        label = self.label(shape)
+        entry = self._stats.get(label)
+        if entry is None:
+            entry = self._stats[label] = {
+                'shape': shape if isinstance(shape, tuple) else None,
+                'histogram': LatencyHistogram(),
+                'rows': 0,
+                'bytes': 0,
+                'errors': {},
+                'server_seconds': 0.0,
+                'server_samples': 0,
+            }
+        return entry
+    
+    def record(self, shape, seconds: float, rows: int = 0, nbytes: int = 0,
+               error_code: Optional[str] = None):
+        """Record one execution of a statement shape"""
+        with self._lock:
+            entry = self._entry(shape)
+            entry['histogram'].record(seconds)
+            entry['rows'] += rows
+            entry['bytes'] += nbytes
+            if error_code is not None:
+                entry['errors'][error_code] = entry['errors'].get(error_code, 0) + 1
+    
+    def record_server_time(self, shape, seconds: float):
+        """Record server-side execution time reported by EXPLAIN ANALYZE"""
+        with self._lock:
+            entry = self._entry(shape)
+            entry['server_seconds'] += seconds
+            entry['server_samples'] += 1
+    
+    def reset(self):
+        """Forget all recorded statements"""
+        with self._lock:
+            self._stats.clear()
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Summary per statement: calls, latency percentiles, rows, bytes, errors"""
+        with self._lock:
+            summary = {}
+            for label, entry in self._stats.items():
+                hist = entry['histogram']
+                summary[label] = {
+                    'calls': hist.count,
+                    'total_ms': hist.total * 1000,
+                    'mean_ms': hist.total / hist.count * 1000 if hist.count else 0.0,
+                    'p50_ms': hist.percentile(50) * 1000,
+                    'p95_ms': hist.percentile(95) * 1000,
+                    'p99_ms': hist.percentile(99) * 1000,
+                    'max_ms': hist.max * 1000,
+                    'rows': entry['rows'],
+                    'bytes': entry['bytes'],
+                    'errors': dict(entry['errors']),
+                    'server_mean_ms': (entry['server_seconds'] / entry['server_samples'] * 1000
+                                       if entry['server_samples'] else None),
+                }
+            return summary
+    
+    def shape_stats(self) -> List[Tuple[Tuple, Dict[str, float]]]:
+        """Calls and latency of statements recorded under a QueryBuilder shape"""
+        with self._lock:
+            return [
+                (entry['shape'], {
+                    'calls': entry['histogram'].count,
+                    'total_ms': entry['histogram'].total * 1000,
+                    'p95_ms': entry['histogram'].percentile(95) * 1000,
+                })
+                for entry in self._stats.values() if entry['shape'] is not None
+            ]
+    
+    def to_json(self) -> str:
+        """Snapshot serialised as JSON"""
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+    
+    @staticmethod
+    def _escape(value: str) -> str:
+        """Escape a Prometheus label value"""
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    
+    def to_prometheus(self, prefix: str = 'inventory_query') -> str:
+        """Prometheus text exposition format"""
+        with self._lock:
+            entries = [(self._escape(label), entry) for label, entry in self._stats.items()]
+            
+            lines = [f"# HELP {prefix}_duration_seconds Statement wall-clock latency",
+                     f"# TYPE {prefix}_duration_seconds histogram"]
+            for label, entry in entries:
+                hist = entry['histogram']
+                for bound in self.PROMETHEUS_BUCKETS:
+                    lines.append(f'{prefix}_duration_seconds_bucket{{statement="{label}",le="{bound}"}} '
+                                 f'{hist.count_at_or_below(bound)}')
+                lines.append(f'{prefix}_duration_seconds_bucket{{statement="{label}",le="+Inf"}} {hist.count}')
+                lines.append(f'{prefix}_duration_seconds_sum{{statement="{label}"}} {hist.total}')
+                lines.append(f'{prefix}_duration_seconds_count{{statement="{label}"}} {hist.count}')
+            
+            counters = [
+                ('rows_total', 'Rows returned', lambda e: e['rows']),
+                ('bytes_total', 'Approximate bytes fetched', lambda e: e['bytes']),
+                ('server_seconds_total', 'Server execution time from EXPLAIN ANALYZE',
+                 lambda e: e['server_seconds']),
+            ]
+            for name, help_text, value in counters:
+                lines.append(f"# HELP {prefix}_{name} {help_text}")
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for label, entry in entries:
+                    lines.append(f'{prefix}_{name}{{statement="{label}"}} {value(entry)}')
+            
+            lines.append(f"# HELP {prefix}_errors_total Failed executions by SQLSTATE")
+            lines.append(f"# TYPE {prefix}_errors_total counter")
+            for label, entry in entries:
+                for code, count in entry['errors'].items():
+                    lines.append(f'{prefix}_errors_total{{statement="{label}",sqlstate="{code}"}} {count}')
+            return '\n'.join(lines) + '\n'
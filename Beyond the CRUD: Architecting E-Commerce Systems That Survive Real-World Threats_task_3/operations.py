@@ -1,164 +1,755 @@
+import gzip
+import io
+import itertools
+import os
+import re
 import psycopg2
+from datetime import date, datetime
 from psycopg2 import sql
-from typing import List, Dict, Any, Optional, Tuple
-from tabulate import tabulate
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
+from display import tabulate
 from security import QueryBuilder
 from database import DatabaseManager
 
 class InventoryOperations:
+    # Multi-row INSERTs larger than this go through the COPY bulk path
+    BULK_INSERT_THRESHOLD = 1000
+    
+    # Formats accepted by export_table (parquet needs the optional pyarrow package)
+    EXPORT_FORMATS = ('csv', 'jsonl', 'parquet')
+    
+    # Rows per Parquet row group; bounds export memory independently of table size
+    PARQUET_ROW_GROUP = 50000
+    
+    # Canned analytics, each a build_aggregate_query specification. Reports on
+    # the rollup tables read precomputed rows; 'refresh' ones first bring the
+    # materialized view up to date (a no-op when products did not change).
+    REPORTS = {
+        'stock_value_by_category': {
+            'title': 'Stock value by category',
+            'table': 'category_stock_value',
+            'refresh': True,
+            'group_by': ['category_name'],
+            'aggregates': [('SUM', 'products', 'products'),
+                           ('SUM', 'units', 'units'),
+                           ('SUM', 'stock_value', 'stock_value')],
+            'order_by': [('stock_value', 'DESC')],
+        },
+        'margin_by_supplier': {
+            'title': 'Margin by supplier',
+            'table': 'products',
+            'group_by': ['suppliers.supplier_name'],
+            'aggregates': [('COUNT', '*', 'products'),
+                           ('AVG', ('-', 'price', 'cost'), 'avg_unit_margin'),
+                           ('SUM', ('*', ('-', 'price', 'cost'), 'quantity'), 'stock_margin')],
+            'order_by': [('stock_margin', 'DESC')],
+        },
+        'units_sold_per_day': {
+            'title': 'Units sold per day',
+            'table': 'daily_product_movements',
+            'filters': [('transaction_type', '=', 'SALE')],
+            'group_by': ['day'],
+            'aggregates': [('SUM', 'movements', 'sales'),
+                           ('SUM', ('*', 'quantity_change', -1), 'units_sold')],
+            'order_by': [('day', 'DESC')],
+        },
+        'movements_per_month': {
+            'title': 'Stock movements per month and type',
+            'table': 'daily_product_movements',
+            'group_by': [('month', 'day'), 'transaction_type'],
+            'aggregates': [('SUM', 'movements', 'movements'),
+                           ('SUM', 'quantity_change', 'net_change')],
+            'order_by': [('month', 'DESC'), 'transaction_type'],
+        },
+    }
+    
+    # Sign applied to the requested quantity; ADJUSTMENT keeps the caller's sign
+    MOVEMENT_SIGNS = {'PURCHASE': 1, 'RETURN': 1, 'SALE': -1, 'ADJUSTMENT': None}
+    
+    # Quantity update and ledger row in one statement; the guard keeps stock >= 0
+    STOCK_MOVEMENT_SQL = """
+        WITH moved AS (
+            UPDATE products
+            SET quantity = quantity + %s
+            WHERE product_id = %s AND quantity + %s >= 0
+            RETURNING product_id, quantity - %s AS previous_quantity, quantity AS new_quantity
+        )
+        INSERT INTO inventory_transactions
+            (product_id, transaction_type, quantity_change, previous_quantity,
+             new_quantity, reference, notes, created_by)
+        SELECT product_id, %s, %s, previous_quantity, new_quantity, %s, %s,
+               COALESCE(%s, current_user)
+        FROM moved
+        RETURNING *
+    """
+    
+    # Batch form: movements arrive as parallel arrays, are netted per product for
+    # the UPDATE and replayed in order (running sum) for the ledger rows. The
+    # guard uses the lowest running balance, so a SALE before the PURCHASE that
+    # covers it is rejected even when the net change is positive
+    STOCK_MOVEMENT_BATCH_SQL = """
+        WITH movement AS (
+            SELECT *
+            FROM unnest(%s::integer[], %s::varchar[], %s::integer[], %s::varchar[], %s::text[])
+                 WITH ORDINALITY AS m(product_id, transaction_type, quantity_change,
+                                      reference, notes, ord)
+        ), total AS (
+            SELECT product_id, SUM(quantity_change) AS delta, MIN(balance) AS low
+            FROM (
+                SELECT product_id, quantity_change,
+                       SUM(quantity_change) OVER (PARTITION BY product_id ORDER BY ord) AS balance
+                FROM movement
+            ) running
+            GROUP BY product_id
+        ), moved AS (
+            UPDATE products p
+            SET quantity = p.quantity + total.delta
+            FROM total
+            WHERE p.product_id = total.product_id AND p.quantity + total.low >= 0
+            RETURNING p.product_id, p.quantity - total.delta AS start_quantity
+        )
+        INSERT INTO inventory_transactions
+            (product_id, transaction_type, quantity_change, previous_quantity,
+             new_quantity, reference, notes, created_by)
+        SELECT m.product_id, m.transaction_type, m.quantity_change,
+               moved.start_quantity + SUM(m.quantity_change) OVER w - m.quantity_change,
+               moved.start_quantity + SUM(m.quantity_change) OVER w,
+               m.reference, m.notes, COALESCE(%s, current_user)
+        FROM movement m
+        JOIN moved USING (product_id)
+        WINDOW w AS (PARTITION BY m.product_id ORDER BY m.ord)
+        ORDER BY m.ord
+        RETURNING *
+    """
+    
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
+        self._stage_ids = itertools.count(1)
+        QueryBuilder.use_catalog(db_manager.catalog)
     
-    def display_table(self, table_name: str):
-        """Display all records from a table"""
+    def display_table(self, table_name: str, batch_size: int = 50):
+        """Display all records from a table, streamed in fixed-size batches"""
         try:
-            query = QueryBuilder.build_select_query(table_name)
-            results = self.db.execute_query(query.as_string(self.db.cursor))
+            query = QueryBuilder.compile(
+                QueryBuilder.select_shape(table_name),
+                lambda: QueryBuilder.build_select_query(table_name),
+                self.db.cursor
+            )
+            rows = self.db.stream_query(query)
             
-            if results:
-                print(f"\n📊 Table: {table_name.upper()}")
-                print("-" * 80)
-                print(tabulate(results, headers="keys", tablefmt="grid"))
-                print(f"Total records: {len(results)}")
+            total = 0
+            for batch in self._batches(rows, batch_size):
+                if total == 0:
+                    print(f"\n📊 Table: {table_name.upper()}")
+                    print("-" * 80)
+                print(tabulate(batch, headers="keys", tablefmt="grid"))
+                total += len(batch)
+            
+            if total:
+                print(f"Total records: {total}")
             else:
                 print(f"No records found in table '{table_name}'")
                 
         except Exception as e:
             print(f"Error displaying table: {str(e)}")
     
-    def filter_single_value(self, table_name: str, column_name: str, value: Any):
+    def fetch_page(self, table_name: str, after: Any = None, before: Any = None,
+                   page_size: int = 20) -> List[Dict[str, Any]]:
+        """Fetch one keyset page ordered by primary key
+        
+        Pass the last key of the current page as `after` for the next page, or
+        its first key as `before` for the previous one.
+        """
+        if after is not None:
+            direction, params = 'next', (after, page_size)
+        elif before is not None:
+            direction, params = 'prev', (before, page_size)
+        else:
+            direction, params = 'first', (page_size,)
+        
+        shape = QueryBuilder.page_shape(table_name, direction)
+        query = QueryBuilder.compile(
+            shape, lambda: QueryBuilder.build_page_query(table_name, direction), self.db.cursor
+        )
+        rows = self.db.execute_prepared(shape, query, params) or []
+        if direction == 'prev':
+            rows.reverse()
+        return rows
+    
+    def display_page(self, table_name: str, rows: List[Dict[str, Any]], page_number: int):
+        """Render one page of a table browse"""
+        print(f"\n📊 Table: {table_name.upper()} (page {page_number})")
+        print("-" * 80)
+        print(tabulate(rows, headers="keys", tablefmt="grid"))
+        print(f"Showing {len(rows)} records")
+    
+    @staticmethod
+    def _batches(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+        """Group a row stream into lists of at most `size` rows"""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def export_table(self, table_name: str, path: str, fmt: str = 'csv',
+                     filters: Optional[List[Tuple[str, str, Any]]] = None,
+                     compress: bool = False, columns: Optional[List[str]] = None) -> Optional[int]:
+        """Stream a table, optionally filtered and projected, to a CSV / JSON Lines / Parquet file
+        
+        CSV and JSON Lines go through COPY (SELECT ...) TO STDOUT straight into
+        the (optionally gzipped) file; Parquet is written in row groups from a
+        server-side cursor. Memory use does not grow with the table size.
+        Returns the number of rows exported.
+        """
+        fmt = fmt.lower()
+        if fmt not in self.EXPORT_FORMATS:
+            print(f"Error: Unsupported export format '{fmt}'")
+            return None
+        
+        created = False
+        try:
+            query = QueryBuilder.build_select_query(table_name, filters, columns)
+            params = tuple(QueryBuilder.filter_params(filters))
+            
+            if fmt == 'parquet':
+                # Removes its own partial file; the path may hold an unrelated file until then
+                exported = self._export_parquet(table_name, query, params, path, compress, columns)
+            else:
+                # COPY takes no bind parameters, so values are quoted client-side
+                encoding = psycopg2.extensions.encodings[self.db.connection.encoding]
+                select = self.db.cursor.mogrify(query.as_string(self.db.cursor), params).decode(encoding)
+                statement = QueryBuilder.build_copy_to_query(select, fmt)
+                
+                with (gzip.open(path, 'wb') if compress else open(path, 'wb')) as f:
+                    created = True
+                    exported = self.db.execute_copy(
+                        statement.as_string(self.db.cursor), f,
+                        shape=QueryBuilder.export_shape(table_name, filters, fmt)
+                    )
+            
+            print(f"✅ Exported {exported} records from '{table_name}' to {path}")
+            return exported
+            
+        except Exception as e:
+            if created and os.path.exists(path):
+                os.remove(path)
+            print(f"Error exporting table: {str(e)}")
+            return None
+    
+    def _export_parquet(self, table_name: str, query: sql.Composed, params: Tuple,
+                        path: str, compress: bool, columns: Optional[List[str]] = None) -> int:
+        """Write a streamed query result as Parquet, one row group at a time
+        
+        A partial file is removed on failure, but only once ParquetWriter has
+        created it, so a missing pyarrow never touches an existing file.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires the 'pyarrow' package")
+        
+        columns = columns or self.db.get_table_columns(table_name)
+        schema = pa.schema([
+            (col, self._arrow_type(pa, self.db.catalog.column_type(table_name, col)))
+            for col in columns
+        ])
+        rows = self.db.stream_query(query.as_string(self.db.cursor), params)
+        
+        exported = 0
+        writer = pq.ParquetWriter(path, schema, compression='gzip' if compress else 'snappy')
+        try:
+            with writer:
+                for batch in self._batches(rows, self.PARQUET_ROW_GROUP):
+                    arrays = []
+                    for field in schema:
+                        values = [row[field.name] for row in batch]
+                        if pa.types.is_string(field.type):
+                            values = [None if v is None else str(v) for v in values]
+                        arrays.append(pa.array(values, type=field.type))
+                    writer.write_batch(pa.record_batch(arrays, schema=schema))
+                    exported += len(batch)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        return exported
+    
+    @staticmethod
+    def _arrow_type(pa, column_type: Optional[str]):
+        """Arrow type for a Postgres format_type() string; unknown types export as text"""
+        column_type = column_type or ''
+        base, _, modifier = column_type.partition('(')
+        if base == 'numeric' and modifier:
+            precision, _, scale = modifier.rstrip(')').partition(',')
+            return pa.decimal128(int(precision), int(scale or 0))
+        return {
+            'smallint': pa.int16(),
+            'integer': pa.int32(),
+            'bigint': pa.int64(),
+            'real': pa.float32(),
+            'double precision': pa.float64(),
+            'boolean': pa.bool_(),
+            'date': pa.date32(),
+            'timestamp without time zone': pa.timestamp('us'),
+            'timestamp with time zone': pa.timestamp('us', tz='UTC'),
+        }.get(column_type, pa.string())
+    
+    def filter_single_value(self, table_name: str, column_name: str, value: Any,
+                            quiet: bool = False) -> Optional[List[Dict[str, Any]]]:
         """Filter records by single column value"""
         try:
             if not QueryBuilder.validate_identifier(table_name, column_name):
                 print(f"Error: Invalid column '{column_name}' for table '{table_name}'")
-                return
+                return None
             
-            query = QueryBuilder.build_select_query(
-                table_name, 
-                [(column_name, '=', value)]
+            filters = [(column_name, '=', value)]
+            shape = QueryBuilder.select_shape(table_name, filters)
+            query = QueryBuilder.compile(
+                shape, lambda: QueryBuilder.build_select_query(table_name, filters), self.db.cursor
             )
             
-            results = self.db.execute_query(
-                query.as_string(self.db.cursor), 
+            results = self.db.execute_prepared(
+                shape,
+                query,
                 (QueryBuilder.sanitize_value(value),)
             )
             
-            if results:
+            if quiet:
+                pass
+            elif results:
                 print(f"\n🔍 Filtered Results ({column_name} = {value})")
                 print("-" * 80)
                 print(tabulate(results, headers="keys", tablefmt="grid"))
                 print(f"Found: {len(results)} records")
             else:
                 print(f"No records found with {column_name} = {value}")
+            return results
                 
         except Exception as e:
             print(f"Error filtering data: {str(e)}")
+            return None
     
-    def filter_multiple_values(self, table_name: str, filters: List[Tuple[str, str, Any]]):
-        """Filter records by multiple conditions"""
+    def filter_multiple_values(self, table_name: str, filters: List[Tuple[str, str, Any]],
+                               columns: Optional[List[str]] = None,
+                               order_by: Optional[List[Any]] = None, limit: Optional[int] = None,
+                               quiet: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """Filter records by multiple conditions
+        
+        `columns`, `order_by` and `limit` are pushed down to Postgres so only
+        the requested columns of the top rows are fetched. Returns the rows
+        (None on error); `quiet` skips printing them.
+        """
         try:
             # Validate all filters
             for col, op, val in filters:
                 if not QueryBuilder.validate_identifier(table_name, col):
                     print(f"Error: Invalid column '{col}' for table '{table_name}'")
-                    return
+                    return None
             
-            query = QueryBuilder.build_select_query(table_name, filters)
+            shape = QueryBuilder.select_shape(table_name, filters, columns, order_by, limit)
+            query = QueryBuilder.compile(
+                shape,
+                lambda: QueryBuilder.build_select_query(table_name, filters, columns, order_by, limit),
+                self.db.cursor
+            )
             
-            # Prepare parameters
-            params = []
-            for col, op, val in filters:
-                if op.upper() == 'IN':
-                    params.extend([QueryBuilder.sanitize_value(v) for v in val])
-                else:
-                    params.append(QueryBuilder.sanitize_value(val))
+            # Prepare parameters (IN lists bind as a single array)
+            params = QueryBuilder.select_params(filters, order_by, limit)
             
-            results = self.db.execute_query(query.as_string(self.db.cursor), tuple(params))
+            results = self.db.execute_prepared(shape, query, params)
             
-            if results:
+            if quiet:
+                pass
+            elif results:
                 print(f"\n🔍 Filtered Results (Multiple Conditions)")
                 print("-" * 80)
                 print(tabulate(results, headers="keys", tablefmt="grid"))
                 print(f"Found: {len(results)} records")
             else:
                 print("No records found matching all conditions")
+            return results
                 
         except Exception as e:
             print(f"Error filtering data: {str(e)}")
+            return None
+    
+    def aggregate(self, table_name: str, group_by: List[Any], aggregates: List[Tuple[str, Any, str]],
+                  filters: Optional[List[Tuple[str, str, Any]]] = None,
+                  order_by: Optional[List[Any]] = None,
+                  limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Run a server-side GROUP BY (see QueryBuilder.build_aggregate_query)"""
+        shape = QueryBuilder.aggregate_shape(table_name, group_by, aggregates, filters, order_by, limit)
+        query = QueryBuilder.compile(
+            shape,
+            lambda: QueryBuilder.build_aggregate_query(
+                table_name, group_by, aggregates, filters, order_by, limit
+            ),
+            self.db.cursor
+        )
+        params = QueryBuilder.filter_params(filters)
+        if limit is not None:
+            params.append(int(limit))
+        return self.db.execute_prepared(shape, query, tuple(params))
+    
+    def run_report(self, name: str, filters: Optional[List[Tuple[str, str, Any]]] = None,
+                   limit: Optional[int] = None, quiet: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """Run and display one of REPORTS; extra filters are AND-ed to the report's own
+        
+        The query runs on the warm report_role session when one is configured.
+        """
+        report = self.REPORTS.get(name)
+        if report is None:
+            print(f"Error: Unknown report '{name}'")
+            return None
+        try:
+            if report.get('refresh'):
+                self.refresh_rollups(quiet=True, if_permitted=True)
+            with self.db.reporting():
+                rows = self.aggregate(
+                    report['table'], report['group_by'], report['aggregates'],
+                    list(report.get('filters', [])) + list(filters or []),
+                    report.get('order_by'), limit
+                )
+            if rows is None:
+                print(f"Error running report '{name}'")
+                return None
+            if quiet:
+                return rows
+            
+            print(f"\n📊 {report['title']}")
+            print("-" * 80)
+            if rows:
+                print(tabulate(rows, headers="keys", tablefmt="grid", floatfmt=".2f"))
+            else:
+                print("No data for this report")
+            return rows
+            
+        except Exception as e:
+            print(f"Error running report: {str(e)}")
+            return None
+    
+    def refresh_rollups(self, force: bool = False, quiet: bool = False,
+                        if_permitted: bool = False) -> Optional[bool]:
+        """Bring the materialized rollups up to date
+        
+        The per-product daily movement rollup is maintained by a trigger on
+        ledger inserts; `force` rebuilds it from the ledger. The category
+        valuation view is refreshed concurrently (readers are not blocked)
+        only when products or categories changed since the last refresh
+        (inserts and deletes included), or when forced.
+        With `if_permitted` roles without EXECUTE on the refresh function
+        (report_user) skip it instead of failing.
+        Returns whether the valuation view was refreshed.
+        """
+        try:
+            if force:
+                self.db.execute_query("SELECT rebuild_daily_product_movements()", analyze=False)
+            if if_permitted:
+                # EXECUTE is checked when the statement starts, so probe it separately
+                allowed = self.db.execute_query(
+                    "SELECT has_function_privilege("
+                    "'refresh_category_stock_value(boolean)', 'EXECUTE') AS allowed"
+                )
+                if not allowed or not allowed[0]['allowed']:
+                    return False
+            rows = self.db.execute_query(
+                "SELECT refresh_category_stock_value(%s) AS refreshed", (force,), analyze=False
+            )
+            if not rows:
+                print("Error refreshing rollups")
+                return None
+            refreshed = rows[0]['refreshed']
+            if not quiet:
+                print("✅ Rollups refreshed" if refreshed else "Rollups already up to date")
+            return refreshed
+        except Exception as e:
+            print(f"Error refreshing rollups: {str(e)}")
+            return None
+    
+    def ledger_partitions(self) -> List[Dict[str, Any]]:
+        """Monthly partitions of inventory_transactions with bounds and estimated rows"""
+        return self.db.execute_query("""
+            SELECT c.relname AS partition,
+                   pg_get_expr(c.relpartbound, c.oid) AS bounds,
+                   GREATEST(c.reltuples, 0)::bigint AS approx_rows
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'inventory_transactions'::regclass
+            ORDER BY c.relname
+        """) or []
+    
+    @staticmethod
+    def _partition_month(partition: str) -> Optional[date]:
+        """Month of an inventory_transactions_YYYY_MM partition (None for the default one)"""
+        match = re.search(r'_(\d{4})_(\d{2})$', partition)
+        return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+    
+    @staticmethod
+    def _add_months(month: date, count: int) -> date:
+        """First day of the month `count` months after `month`"""
+        index = month.year * 12 + month.month - 1 + count
+        return date(index // 12, index % 12 + 1, 1)
+    
+    def maintain_partitions(self, months_ahead: int = 3, retain_months: Optional[int] = None,
+                            archive_dir: Optional[str] = None) -> Optional[Dict[str, List[str]]]:
+        """Pre-create upcoming ledger partitions and retire old ones
+        
+        Partitions are created for the current month and `months_ahead`
+        months after it, and for any month whose rows ended up in the default
+        partition. With `retain_months`, partitions older than that many
+        months are detached; with `archive_dir` they are first exported there
+        as gzipped CSV and then dropped. Daily rollups keep their history.
+        Returns {'created': [...], 'retired': [...]} partition names.
+        """
+        try:
+            this_month = date.today().replace(day=1)
+            existing = {p['partition'] for p in self.ledger_partitions()}
+            
+            stranded = self.db.execute_query(
+                "SELECT DISTINCT date_trunc('month', created_at)::date AS month "
+                "FROM inventory_transactions_default"
+            ) or []
+            months = {self._add_months(this_month, i) for i in range(months_ahead + 1)}
+            months.update(row['month'] for row in stranded)
+            
+            created = []
+            for month in sorted(months):
+                rows = self.db.execute_query(
+                    "SELECT create_inventory_partition(%s) AS partition", (month,),
+                    analyze=False
+                )
+                if not rows:
+                    raise RuntimeError(f"could not create partition for {month:%Y-%m}")
+                if rows[0]['partition'] not in existing:
+                    created.append(rows[0]['partition'])
+            
+            retired = []
+            if retain_months is not None:
+                cutoff = self._add_months(this_month, -retain_months)
+                for partition in self.ledger_partitions():
+                    month = self._partition_month(partition['partition'])
+                    if month is None or month >= cutoff:
+                        continue
+                    if archive_dir:
+                        path = os.path.join(archive_dir, f"{partition['partition']}.csv.gz")
+                        filters = [('created_at', '>=', month),
+                                   ('created_at', '<', self._add_months(month, 1))]
+                        if self.export_table('inventory_transactions', path, 'csv',
+                                             filters, compress=True) is None:
+                            raise RuntimeError(f"could not archive {partition['partition']}")
+                    rows = self.db.execute_query(
+                        "SELECT detach_inventory_partition(%s, %s) AS partition",
+                        (month, archive_dir is not None), analyze=False
+                    )
+                    if not rows:
+                        raise RuntimeError(f"could not detach {partition['partition']}")
+                    retired.append(partition['partition'])
+            
+            print(f"✅ Ledger partitions: {len(created)} created, {len(retired)} "
+                  + ("archived and dropped" if archive_dir else "detached"))
+            return {'created': created, 'retired': retired}
+            
+        except Exception as e:
+            print(f"Error maintaining partitions: {str(e)}")
+            return None
     
     def update_single_record(self, table_name: str, record_id: int, 
-                           updates: Dict[str, Any]):
-        """Update single record by ID"""
+                           updates: Dict[str, Any]) -> Optional[int]:
+        """Update single record by ID; returns rows affected (None on error)"""
         try:
+            id_column = QueryBuilder.primary_key(table_name)
+            
             # Don't allow updating ID columns
-            if 'id' in updates or f'{table_name[:-1]}_id' in updates:
+            if 'id' in updates or id_column in updates:
                 print("Error: Cannot update ID columns")
-                return
+                return None
             
             # Validate columns
             for col in updates.keys():
                 if not QueryBuilder.validate_identifier(table_name, col):
                     print(f"Error: Invalid column '{col}' for table '{table_name}'")
-                    return
+                    return None
             
             # Prepare SET clause
             set_clauses = [(col, val) for col, val in updates.items()]
             
             # Prepare WHERE clause (always use primary key)
-            id_column = f"{table_name[:-1]}_id" if table_name.endswith('s') else f"{table_name}_id"
             where_clauses = [(id_column, '=', record_id)]
             
-            query = QueryBuilder.build_update_query(table_name, set_clauses, where_clauses)
+            shape = QueryBuilder.update_shape(table_name, set_clauses, where_clauses)
+            query = QueryBuilder.compile(
+                shape,
+                lambda: QueryBuilder.build_update_query(table_name, set_clauses, where_clauses),
+                self.db.cursor
+            )
             
             # Prepare parameters (SET values first, then WHERE values)
             params = [QueryBuilder.sanitize_value(val) for col, val in updates.items()]
             params.append(QueryBuilder.sanitize_value(record_id))
             
-            result = self.db.execute_query(query.as_string(self.db.cursor), tuple(params))
+            result = self.db.execute_prepared(shape, query, tuple(params))
+            if result is None and self.db.cursor.rowcount < 0:
+                return None
             
-            if self.db.cursor.rowcount > 0:
+            updated = self.db.cursor.rowcount
+            if updated > 0:
                 print(f"✅ Successfully updated record with {id_column} = {record_id}")
-                print(f"Rows affected: {self.db.cursor.rowcount}")
+                print(f"Rows affected: {updated}")
             else:
                 print(f"No record found with {id_column} = {record_id}")
+            return updated
                 
         except Exception as e:
             print(f"Error updating record: {str(e)}")
+            return None
     
     def update_multiple_records(self, table_name: str, 
                               filter_column: str, filter_values: List[Any],
-                              update_column: str, new_value: Any):
-        """Update multiple records with common value"""
+                              update_column: str, new_value: Any) -> Optional[int]:
+        """Update multiple records with common value; returns rows affected (None on error)"""
         try:
             # Validate columns
             if not QueryBuilder.validate_identifier(table_name, filter_column):
                 print(f"Error: Invalid filter column '{filter_column}'")
-                return
+                return None
             if not QueryBuilder.validate_identifier(table_name, update_column):
                 print(f"Error: Invalid update column '{update_column}'")
-                return
+                return None
             
             # Don't allow updating ID columns
             if update_column.endswith('_id'):
                 print("Error: Cannot update ID columns")
-                return
+                return None
             
             set_clauses = [(update_column, new_value)]
-            where_clauses = [(filter_column, 'IN', filter_values)]
             
-            query = QueryBuilder.build_update_query(table_name, set_clauses, where_clauses)
+            if len(filter_values) > QueryBuilder.ARRAY_FILTER_LIMIT:
+                updated = self._update_via_value_table(
+                    table_name, set_clauses, filter_column, filter_values
+                )
+            else:
+                where_clauses = [(filter_column, 'IN', filter_values)]
+                shape = QueryBuilder.update_shape(table_name, set_clauses, where_clauses)
+                query = QueryBuilder.compile(
+                    shape,
+                    lambda: QueryBuilder.build_update_query(table_name, set_clauses, where_clauses),
+                    self.db.cursor
+                )
+                
+                # Prepare parameters (the IN list binds as one array)
+                params = [QueryBuilder.sanitize_value(new_value)]
+                params.extend(QueryBuilder.filter_params(where_clauses))
+                
+                result = self.db.execute_prepared(shape, query, tuple(params))
+                updated = self.db.cursor.rowcount
+                if result is None and updated < 0:
+                    return None
             
-            # Prepare parameters
-            params = [QueryBuilder.sanitize_value(new_value)]
-            params.extend([QueryBuilder.sanitize_value(v) for v in filter_values])
+            shown = filter_values if len(filter_values) <= 10 else f"({len(filter_values)} values)"
+            print(f"✅ Successfully updated {updated} records")
+            print(f"Set '{update_column}' = '{new_value}' for records where '{filter_column}' IN {shown}")
+            return updated
             
-            result = self.db.execute_query(query.as_string(self.db.cursor), tuple(params))
+        except Exception as e:
+            print(f"Error updating records: {str(e)}")
+            return None
+    
+    def _update_via_value_table(self, table_name: str, set_clauses: List[Tuple[str, Any]],
+                                filter_column: str, filter_values: List[Any]) -> int:
+        """Run a very large IN-list UPDATE as a join against a COPY-loaded temp table"""
+        value_table = f"filter_values_{next(self._stage_ids)}"
+        create, copy = QueryBuilder.build_value_table_queries(table_name, filter_column, value_table)
+        
+        buffer = io.StringIO()
+        for value in filter_values:
+            buffer.write(self._csv_field(value))
+            buffer.write('\n')
+        buffer.seek(0)
+        
+        with self.db.transaction():
+            self.db.cursor.execute(create)
+            self.db.execute_copy(copy.as_string(self.db.cursor), buffer,
+                                 ('value_table', table_name, filter_column))
+            self.db.cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(value_table)))
             
-            print(f"✅ Successfully updated {self.db.cursor.rowcount} records")
-            print(f"Set '{update_column}' = '{new_value}' for records where '{filter_column}' IN {filter_values}")
+            query = QueryBuilder.build_update_in_table_query(
+                table_name, set_clauses, filter_column, value_table
+            )
+            params = tuple(QueryBuilder.sanitize_value(val) for col, val in set_clauses)
+            self.db.execute_query(
+                query.as_string(self.db.cursor), params,
+                shape=('update_in_table', table_name, tuple(col for col, val in set_clauses),
+                       filter_column)
+            )
+            return self.db.cursor.rowcount
+    
+    def bulk_update(self, table_name: str, updates: Iterable[Tuple[Any, Dict[str, Any]]],
+                    chunk_size: int = 5000) -> Optional[Dict[Any, int]]:
+        """Apply per-row updates [(key, {column: value}), ...] set-based
+        
+        Rows are grouped by the set of columns they change and each group is
+        sent as one UPDATE ... FROM unnest(...) per chunk, all in a single
+        transaction. Keys are converted to the key column's type first
+        ("5" and 5 are the same integer key) and repeated keys are merged
+        (later values win). Returns {key: rows matched} so unknown keys show
+        up as 0.
+        """
+        try:
+            if not QueryBuilder.validate_writable(table_name):
+                print(f"Error: Invalid or read-only table '{table_name}'")
+                return None
+            key_column = QueryBuilder.primary_key(table_name)
+            # Matched rows come back as the column's type; JSON clients often send "5"
+            key_type = (self.db.catalog.column_type(table_name, key_column) or '').partition('(')[0]
+            normalize = int if key_type in ('smallint', 'integer', 'bigint') else (lambda key: key)
+            
+            merged: Dict[Any, Dict[str, Any]] = {}
+            for key, values in updates:
+                merged.setdefault(normalize(key), {}).update(values)
+            
+            groups: Dict[Tuple[str, ...], List[Any]] = {}
+            for key, values in merged.items():
+                for col in values:
+                    if not QueryBuilder.validate_identifier(table_name, col):
+                        print(f"Error: Invalid column '{col}'")
+                        return None
+                    if col.endswith('_id'):
+                        print("Error: Cannot update ID columns")
+                        return None
+                if values:
+                    groups.setdefault(tuple(sorted(values)), []).append(key)
+            
+            matched = {key: 0 for key in merged}
+            with self.db.transaction():
+                for columns, keys in groups.items():
+                    shape = QueryBuilder.bulk_update_shape(table_name, key_column, columns)
+                    query = QueryBuilder.compile(
+                        shape,
+                        lambda: QueryBuilder.build_bulk_update_query(table_name, key_column, list(columns)),
+                        self.db.cursor
+                    )
+                    for start in range(0, len(keys), chunk_size):
+                        chunk = keys[start:start + chunk_size]
+                        params = [chunk] + [
+                            [QueryBuilder.sanitize_value(merged[key][col]) for key in chunk]
+                            for col in columns
+                        ]
+                        for row in self.db.execute_prepared(shape, query, tuple(params)) or []:
+                            matched[row[key_column]] += 1
+            
+            hits = sum(1 for count in matched.values() if count)
+            print(f"✅ Bulk-updated {hits} of {len(matched)} records in '{table_name}'"
+                  + (f", {len(matched) - hits} not found" if hits < len(matched) else ""))
+            return matched
             
         except Exception as e:
-            print(f"Error updating records: {str(e)}")
+            print(f"Error bulk-updating records: {str(e)}")
+            return None
     
     def insert_single_record(self, table_name: str, data: Dict[str, Any]):
         """Insert single record into table"""
@@ -172,12 +763,16 @@ class InventoryOperations:
                     print(f"Error: Invalid column '{col}' for table '{table_name}'")
                     return
             
-            query = QueryBuilder.build_insert_query(table_name, columns, [values])
+            shape = QueryBuilder.insert_shape(table_name, columns, [values])
+            query = QueryBuilder.compile(
+                shape, lambda: QueryBuilder.build_insert_query(table_name, columns, [values]),
+                self.db.cursor
+            )
             
             # Sanitize values
             sanitized_values = [QueryBuilder.sanitize_value(v) for v in values]
             
-            result = self.db.execute_query(query.as_string(self.db.cursor), tuple(sanitized_values))
+            result = self.db.execute_prepared(shape, query, tuple(sanitized_values))
             
             if result:
                 print(f"✅ Successfully inserted record into '{table_name}'")
@@ -188,32 +783,86 @@ class InventoryOperations:
             print(f"Error inserting record: {str(e)}")
             return None
     
-    def insert_related_records(self, tables_data: List[Tuple[str, Dict[str, Any], str]]):
-        """Insert records into multiple related tables"""
+    def insert_related_records(self, tables_data: List[Tuple[str, Dict[str, Any], str]],
+                               single_statement: bool = True):
+        """Insert records into multiple related tables
+        
+        By default the whole parent/child graph is compiled into one
+        WITH ... INSERT ... RETURNING statement (one atomic round trip), with
+        foreign keys wired from the schema catalog. single_statement=False
+        falls back to one INSERT per table inside a transaction.
+        """
+        if single_statement:
+            return self._insert_related_single_statement(tables_data)
+        
         try:
             inserted_ids = []
             
+            # All-or-nothing: a failed child insert rolls back its parents
+            with self.db.transaction():
+                for i, (table_name, data, id_column) in enumerate(tables_data):
+                    # If this is not the first table, we might need to use previous ID
+                    if i > 0 and id_column:
+                        # Find foreign key column that references previous table
+                        for col in data.keys():
+                            if col.endswith('_id'):
+                                # Use the ID from previous insertion
+                                prev_table = tables_data[i-1][0]
+                                if col == f"{prev_table[:-1]}_id":
+                                    data[col] = inserted_ids[-1]
+                    
+                    result = self.insert_single_record(table_name, data)
+                    if result is None:
+                        raise ValueError(f"Insert into '{table_name}' failed")
+                    if id_column:
+                        inserted_ids.append(result[id_column])
+                    else:
+                        # If no specific ID column, try common ones
+                        for key in result.keys():
+                            if key.endswith('_id'):
+                                inserted_ids.append(result[key])
+                                break
+            
+            print(f"✅ Successfully inserted related records across {len(tables_data)} tables")
+            return inserted_ids
+            
+        except Exception as e:
+            print(f"Error inserting related records: {str(e)}")
+            return None
+    
+    def _insert_related_single_statement(self, tables_data: List[Tuple[str, Dict[str, Any], str]]):
+        """Insert a related-record graph with one chained-CTE statement"""
+        try:
+            nodes = []
+            params = []
             for i, (table_name, data, id_column) in enumerate(tables_data):
-                # If this is not the first table, we might need to use previous ID
-                if i > 0 and id_column:
-                    # Find foreign key column that references previous table
-                    for col in data.keys():
-                        if col.endswith('_id'):
-                            # Use the ID from previous insertion
-                            prev_table = tables_data[i-1][0]
-                            if col == f"{prev_table[:-1]}_id":
-                                data[col] = inserted_ids[-1]
-                
-                result = self.insert_single_record(table_name, data)
-                if result and id_column:
-                    inserted_ids.append(result[id_column])
-                elif result:
-                    # If no specific ID column, try common ones
-                    for key in result.keys():
-                        if key.endswith('_id'):
-                            inserted_ids.append(result[key])
+                # Wire each foreign key to the nearest earlier table it references
+                links = {}
+                for col, (ref_table, ref_column) in self.db.catalog.foreign_keys(table_name).items():
+                    for parent in range(i - 1, -1, -1):
+                        if tables_data[parent][0] == ref_table:
+                            links[col] = (parent, ref_column)
                             break
+                
+                columns = [col for col in data if col not in links]
+                for col in columns:
+                    if not QueryBuilder.validate_identifier(table_name, col):
+                        print(f"Error: Invalid column '{col}' for table '{table_name}'")
+                        return None
+                params.extend(QueryBuilder.sanitize_value(data[col]) for col in columns)
+                nodes.append((table_name, columns, links,
+                              id_column or QueryBuilder.primary_key(table_name)))
             
+            shape = QueryBuilder.related_insert_shape(nodes)
+            query = QueryBuilder.compile(
+                shape, lambda: QueryBuilder.build_related_insert_query(nodes), self.db.cursor
+            )
+            result = self.db.execute_prepared(shape, query, tuple(params))
+            if not result:
+                print("Error inserting related records: statement failed")
+                return None
+            
+            inserted_ids = [result[0][f"t{i}"] for i in range(len(nodes))]
             print(f"✅ Successfully inserted related records across {len(tables_data)} tables")
             return inserted_ids
             
@@ -221,8 +870,12 @@ class InventoryOperations:
             print(f"Error inserting related records: {str(e)}")
             return None
     
-    def insert_multiple_records(self, table_name: str, records: List[Dict[str, Any]]):
-        """Insert multiple records into single table"""
+    def insert_multiple_records(self, table_name: str, records: List[Dict[str, Any]]) -> Optional[List[Any]]:
+        """Insert multiple records into single table
+        
+        Returns the generated primary keys in input order (None on error),
+        whether the rows went through one INSERT or the COPY bulk path.
+        """
         try:
             if not records:
                 print("No records to insert")
@@ -243,23 +896,205 @@ class InventoryOperations:
                     print(f"Error: Invalid column '{col}' for table '{table_name}'")
                     return
             
-            # Prepare values list
-            values_list = [list(record.values()) for record in records]
+            # Large batches would hit the bind-parameter limit; stream them via COPY
+            if (len(records) > self.BULK_INSERT_THRESHOLD or
+                    len(records) * len(columns) > QueryBuilder.MAX_BIND_PARAMS):
+                return self.bulk_load(table_name, records, columns, return_keys=True)
             
-            query = QueryBuilder.build_insert_query(table_name, columns, values_list)
+            # Prepare values list (in column order, whatever each record's key order)
+            values_list = [[record[col] for col in columns] for record in records]
+            
+            shape = QueryBuilder.insert_shape(table_name, columns, values_list)
+            query = QueryBuilder.compile(
+                shape, lambda: QueryBuilder.build_insert_query(table_name, columns, values_list),
+                self.db.cursor
+            )
             
             # Flatten values and sanitize
             flat_values = []
             for values in values_list:
                 flat_values.extend([QueryBuilder.sanitize_value(v) for v in values])
             
-            result = self.db.execute_query(query.as_string(self.db.cursor), tuple(flat_values))
+            result = self.db.execute_prepared(shape, query, tuple(flat_values))
+            if result is None:
+                return None
             
             print(f"✅ Successfully inserted {len(records)} records into '{table_name}'")
             print(f"Rows affected: {self.db.cursor.rowcount}")
             
-            return result
+            key_column = QueryBuilder.primary_key(table_name)
+            return [row[key_column] for row in result]
             
         except Exception as e:
             print(f"Error inserting multiple records: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+    
+    def bulk_load(self, table_name: str, records: Iterable[Dict[str, Any]],
+                  columns: Optional[List[str]] = None, chunk_size: int = 5000,
+                  return_keys: bool = False):
+        """Bulk insert records with COPY ... FROM STDIN in CSV chunks
+        
+        Records are consumed lazily, so any iterable (generator, file reader)
+        can be loaded with memory bounded by `chunk_size`. The whole load is one
+        transaction. With `return_keys` the rows are staged in a temporary
+        table first and the generated primary keys are returned in load order;
+        otherwise the number of loaded rows is returned.
+        """
+        try:
+            records = iter(records)
+            first = next(records, None)
+            if first is None:
+                print("No records to insert")
+                return [] if return_keys else 0
+            
+            columns = list(columns or first.keys())
+            for col in columns:
+                if not QueryBuilder.validate_identifier(table_name, col):
+                    print(f"Error: Invalid column '{col}' for table '{table_name}'")
+                    return None
+            
+            staging = f"bulk_stage_{next(self._stage_ids)}" if return_keys else None
+            copy_query = QueryBuilder.build_copy_from_query(table_name, columns, staging)
+            column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+            loaded = 0
+            keys = None
+            
+            with self.db.transaction():
+                if staging:
+                    self.db.cursor.execute(
+                        sql.SQL("CREATE TEMP TABLE {} ON COMMIT DROP AS "
+                                "SELECT {} FROM {} WITH NO DATA").format(
+                            sql.Identifier(staging), column_list, sql.Identifier(table_name)
+                        )
+                    )
+                
+                copy_sql = copy_query.as_string(self.db.cursor)
+                for chunk in self._batches(itertools.chain([first], records), chunk_size):
+                    buffer = io.StringIO()
+                    for record in chunk:
+                        if set(record.keys()) != set(columns):
+                            raise ValueError("All records must have the same columns")
+                        buffer.write(','.join(self._csv_field(record[col]) for col in columns))
+                        buffer.write('\n')
+                    buffer.seek(0)
+                    loaded += self.db.execute_copy(copy_sql, buffer, ('copy', table_name, tuple(columns)))
+                
+                if staging:
+                    key_column = QueryBuilder.primary_key(table_name)
+                    # ctid order of a freshly COPYed temp table is the load order
+                    rows = self.db.execute_query(
+                        sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} ORDER BY ctid "
+                                "RETURNING {}").format(
+                            sql.Identifier(table_name), column_list, column_list,
+                            sql.Identifier(staging), sql.Identifier(key_column)
+                        ).as_string(self.db.cursor),
+                        shape=('bulk_stage', table_name, tuple(columns))
+                    )
+                    keys = [row[key_column] for row in rows]
+            
+            print(f"✅ Successfully bulk loaded {loaded} records into '{table_name}'")
+            return keys if return_keys else loaded
+            
+        except Exception as e:
+            print(f"Error bulk loading records: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _csv_field(value: Any) -> str:
+        """Encode one value for COPY CSV: bare empty field is NULL, text is always quoted"""
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, (int, float)):
+            return str(value)
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        text = str(QueryBuilder.sanitize_value(value))
+        return '"' + text.replace('"', '""') + '"'
+    
+    def _signed_quantity(self, movement_type: str, quantity: int) -> Tuple[str, int]:
+        """Validate a movement and return (type, signed quantity change)"""
+        movement_type = str(movement_type).strip().upper()
+        if movement_type not in self.MOVEMENT_SIGNS:
+            raise ValueError(f"Invalid movement type: {movement_type}")
+        quantity = int(quantity)
+        if quantity == 0:
+            raise ValueError("Movement quantity must be non-zero")
+        sign = self.MOVEMENT_SIGNS[movement_type]
+        return movement_type, quantity if sign is None else sign * abs(quantity)
+    
+    def record_stock_movement(self, product_id: int, movement_type: str, quantity: int,
+                              reference: Optional[str] = None, notes: Optional[str] = None,
+                              created_by: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Apply a SALE/PURCHASE/RETURN/ADJUSTMENT atomically on the server
+        
+        products.quantity is updated and the inventory_transactions row is
+        written by one UPDATE ... RETURNING statement, so previous/new
+        quantities are exact under concurrent movements. Returns the ledger
+        row, or None if the product is unknown or stock would go negative.
+        """
+        try:
+            movement_type, change = self._signed_quantity(movement_type, quantity)
+            params = (change, product_id, change, change, movement_type, change,
+                      QueryBuilder.sanitize_value(reference),
+                      QueryBuilder.sanitize_value(notes),
+                      QueryBuilder.sanitize_value(created_by))
+            result = self.db.execute_prepared(
+                ('stock_movement', 'single'), self.STOCK_MOVEMENT_SQL, params
+            )
+            
+            if result:
+                row = result[0]
+                print(f"✅ {movement_type} recorded for product {product_id}: "
+                      f"{row['previous_quantity']} -> {row['new_quantity']}")
+                return row
+            if result is not None:
+                print(f"No stock movement applied: product {product_id} not found "
+                      f"or insufficient stock")
+            return None
+            
+        except Exception as e:
+            print(f"Error recording stock movement: {str(e)}")
+            return None
+    
+    def record_stock_movements(self, movements: List[Dict[str, Any]],
+                               created_by: Optional[str] = None) -> Optional[Dict[str, List]]:
+        """Apply many stock movements (possibly several per SKU) in one statement
+        
+        Each movement is a dict with product_id, movement_type, quantity and
+        optional reference/notes. Movements are netted per product for the
+        quantity update and written to the ledger in input order. Products
+        that are unknown or whose stock would go negative at any point in
+        that order are rejected as a whole.
+        Returns {'applied': ledger rows, 'rejected': movements}.
+        """
+        try:
+            columns = ([], [], [], [], [])
+            for movement in movements:
+                movement_type, change = self._signed_quantity(
+                    movement['movement_type'], movement['quantity']
+                )
+                columns[0].append(int(movement['product_id']))
+                columns[1].append(movement_type)
+                columns[2].append(change)
+                columns[3].append(QueryBuilder.sanitize_value(movement.get('reference')))
+                columns[4].append(QueryBuilder.sanitize_value(movement.get('notes')))
+            
+            params = columns + (QueryBuilder.sanitize_value(created_by),)
+            # Concurrent batches can deadlock on overlapping SKUs; retry those
+            applied = self.db.run_in_transaction(
+                lambda: self.db.execute_prepared(
+                    ('stock_movement', 'batch'), self.STOCK_MOVEMENT_BATCH_SQL, params
+                )
+            ) or []
+            
+            applied_products = {row['product_id'] for row in applied}
+            rejected = [m for m in movements if int(m['product_id']) not in applied_products]
+            print(f"✅ Recorded {len(applied)} stock movements"
+                  + (f", rejected {len(rejected)}" if rejected else ""))
+            return {'applied': applied, 'rejected': rejected}
+            
+        except Exception as e:
+            print(f"Error recording stock movements: {str(e)}")
+            return None
@@ -1,7 +1,9 @@
 import psycopg2
 from psycopg2 import sql
 import re
-from typing import List, Tuple, Any
+import threading
+from collections import OrderedDict
+from typing import List, Tuple, Dict, Any, Optional, Callable
 
 class QueryBuilder:
     """Secure SQL query builder to prevent SQL injection"""
@@ -16,63 +18,349 @@ class QueryBuilder:
                     'created_at', 'updated_at'],
         'inventory_transactions': ['transaction_id', 'product_id', 'transaction_type',
                                   'quantity_change', 'previous_quantity', 'new_quantity',
-                                  'reference', 'notes', 'created_at', 'created_by']
+                                  'reference', 'notes', 'created_at', 'created_by'],
+        # Rollups (see 01_create_tables.sql), readable only: see READ_ONLY_TABLES
+        'daily_product_movements': ['product_id', 'day', 'transaction_type',
+                                    'movements', 'quantity_change'],
+        'category_stock_value': ['category_id', 'category_name', 'products', 'units',
+                                 'stock_value', 'stock_margin']
     }
     
+    # Maintained by the database; select, aggregate and export only, never written
+    READ_ONLY_TABLES = frozenset({'daily_product_movements', 'category_stock_value'})
+    
+    # Set form of the whitelist for O(1) membership checks
+    _IDENTIFIER_SETS = {table: frozenset(columns) for table, columns in VALID_IDENTIFIERS.items()}
+    
+    # Fallback primary keys when no live schema catalog is attached
+    PRIMARY_KEYS = {
+        'categories': 'category_id',
+        'suppliers': 'supplier_id',
+        'products': 'product_id',
+        'inventory_transactions': 'transaction_id',
+        'category_stock_value': 'category_id'
+    }
+    
+    # Postgres wire-protocol limit on bind parameters in one statement
+    MAX_BIND_PARAMS = 65535
+    
+    # IN lists longer than this are joined from a temp table instead of an array literal
+    ARRAY_FILTER_LIMIT = 10000
+    
+    # Comparison operators accepted in filters (interpolated as SQL keywords)
+    VALID_OPERATORS = {'=', '!=', '<>', '>', '<', '>=', '<=', 'LIKE', 'ILIKE', 'IN'}
+    
+    # Aggregate functions, date_trunc units and arithmetic allowed in reports
+    AGGREGATE_FUNCTIONS = {'SUM', 'COUNT', 'AVG', 'MIN', 'MAX'}
+    DATE_BUCKETS = {'hour', 'day', 'week', 'month', 'quarter', 'year'}
+    EXPRESSION_OPERATORS = {'+', '-', '*', '/'}
+    
+    # Live SchemaCatalog shared with DatabaseManager (see use_catalog)
+    catalog = None
+    
+    # Rendered SQL text per statement shape (see compile)
+    COMPILED_CACHE_SIZE = 256
+    _compiled: 'OrderedDict[Tuple, str]' = OrderedDict()
+    _compiled_lock = threading.Lock()
+    _compiled_generation = None
+    compiled_hits = 0
+    compiled_misses = 0
+    compiled_evictions = 0
+    
+    @staticmethod
+    def use_catalog(catalog) -> None:
+        """Cross-check the whitelist against a live schema catalog"""
+        QueryBuilder.catalog = catalog
+        QueryBuilder.clear_compiled()
+    
+    @staticmethod
+    def compile(shape: Tuple, build: Callable[[], sql.Composable], context) -> str:
+        """SQL text for a statement shape; build() is only called and rendered on a miss
+        
+        A shape fully determines the statement text, so a hit skips validation,
+        Composed construction and identifier quoting. `context` is the cursor or
+        connection used for quoting. The cache is dropped whenever the schema
+        catalog reloads, since column types are embedded in some statements.
+        """
+        catalog = QueryBuilder.catalog
+        generation = catalog.loads if catalog is not None else None
+        cache = QueryBuilder._compiled
+        with QueryBuilder._compiled_lock:
+            if generation != QueryBuilder._compiled_generation:
+                cache.clear()
+                QueryBuilder._compiled_generation = generation
+            text = cache.get(shape)
+            if text is not None:
+                cache.move_to_end(shape)
+                QueryBuilder.compiled_hits += 1
+                return text
+            QueryBuilder.compiled_misses += 1
+        
+        text = build().as_string(context)
+        with QueryBuilder._compiled_lock:
+            cache[shape] = text
+            if len(cache) > QueryBuilder.COMPILED_CACHE_SIZE:
+                cache.popitem(last=False)
+                QueryBuilder.compiled_evictions += 1
+        return text
+    
+    @staticmethod
+    def clear_compiled() -> None:
+        """Forget all compiled statements"""
+        with QueryBuilder._compiled_lock:
+            QueryBuilder._compiled.clear()
+    
+    @staticmethod
+    def compiled_stats() -> Dict[str, int]:
+        """Compiled statement cache hit/miss counters"""
+        with QueryBuilder._compiled_lock:
+            return {
+                'hits': QueryBuilder.compiled_hits,
+                'misses': QueryBuilder.compiled_misses,
+                'evictions': QueryBuilder.compiled_evictions,
+                'cached': len(QueryBuilder._compiled),
+                'capacity': QueryBuilder.COMPILED_CACHE_SIZE,
+            }
+    
     @staticmethod
     def validate_identifier(table: str, column: str = None) -> bool:
         """Validate table and column names against whitelist"""
-        if table not in QueryBuilder.VALID_IDENTIFIERS:
+        columns = QueryBuilder._IDENTIFIER_SETS.get(table)
+        if columns is None:
             return False
-        if column and column not in QueryBuilder.VALID_IDENTIFIERS[table]:
+        if column and column not in columns:
             return False
+        catalog = QueryBuilder.catalog
+        if column and catalog is not None and catalog.has_table(table):
+            # Whitelisted but dropped/renamed in the database
+            return catalog.has_column(table, column)
         return True
     
     @staticmethod
-    def build_select_query(table: str, filters: List[Tuple[str, str, Any]] = None) -> sql.Composed:
-        """Build SELECT query with parameterized filters"""
+    def validate_writable(table: str) -> bool:
+        """Whitelisted table that INSERT/UPDATE/COPY paths may write to"""
+        return (QueryBuilder.validate_identifier(table)
+                and table not in QueryBuilder.READ_ONLY_TABLES)
+    
+    @staticmethod
+    def primary_key(table: str) -> str:
+        """Primary key column of a whitelisted table"""
         if not QueryBuilder.validate_identifier(table):
             raise ValueError(f"Invalid table name: {table}")
+        catalog = QueryBuilder.catalog
+        if catalog is not None:
+            column = catalog.primary_key(table)
+            if column:
+                return column
+        if table not in QueryBuilder.PRIMARY_KEYS:
+            raise ValueError(f"Table has no single-column key: {table}")
+        return QueryBuilder.PRIMARY_KEYS[table]
+    
+    @staticmethod
+    def validate_operator(op: str) -> str:
+        """Normalise a filter operator and reject anything not whitelisted"""
+        op = op.strip().upper()
+        if op not in QueryBuilder.VALID_OPERATORS:
+            raise ValueError(f"Invalid operator: {op}")
+        return op
+    
+    @staticmethod
+    def _filter_shape(filters: List[Tuple[str, str, Any]]) -> Tuple:
+        """Columns and operators -- everything that changes the SQL text
         
-        query = sql.SQL("SELECT * FROM {}").format(sql.Identifier(table))
+        IN lists bind as one array parameter, so their length is not part of it.
+        """
+        return tuple((col, QueryBuilder.validate_operator(op)) for col, op, val in filters or [])
+    
+    @staticmethod
+    def shape_filters(shape: Tuple) -> Optional[Tuple[str, Tuple[Tuple[str, str], ...]]]:
+        """(table, ((column, operator), ...)) filtered on by a statement shape, if any"""
+        kind = shape[0] if shape else None
+        if kind in ('select', 'export') and len(shape) > 2 and isinstance(shape[2], tuple):
+            return shape[1], shape[2]
+        if kind == 'update' and len(shape) > 3 and shape[2] != 'bulk':
+            return shape[1], shape[3]
+        if kind == 'aggregate':
+            return shape[1], shape[4]
+        return None
+    
+    @staticmethod
+    def _build_condition(table: str, col: str, op: str, qualified: bool = False) -> sql.Composed:
+        """Single parameterized predicate; IN becomes = ANY(<typed array>)"""
+        if not QueryBuilder.validate_identifier(table, col):
+            raise ValueError(f"Invalid column name: {col}")
+        op = QueryBuilder.validate_operator(op)
+        column = sql.Identifier(table, col) if qualified else sql.Identifier(col)
         
-        if filters:
-            conditions = []
-            for col, op, val in filters:
+        if op == 'IN':
+            # One array parameter keeps the statement text (and plan) independent
+            # of the list length and avoids the bind-parameter limit
+            placeholder = sql.Placeholder()
+            column_type = QueryBuilder.catalog.column_type(table, col) if QueryBuilder.catalog else None
+            if column_type:
+                placeholder = sql.SQL("{}::{}[]").format(placeholder, sql.SQL(column_type))
+            return sql.SQL("{} = ANY({})").format(column, placeholder)
+        
+        return sql.SQL("{} {} {}").format(
+            column,
+            sql.SQL(op),
+            sql.Placeholder()
+        )
+    
+    @staticmethod
+    def filter_params(filters: List[Tuple[str, str, Any]]) -> List[Any]:
+        """Sanitized parameters matching the placeholders of a filter list"""
+        params = []
+        for col, op, val in filters or []:
+            if op.strip().upper() == 'IN':
+                params.append([QueryBuilder.sanitize_value(v) for v in val])
+            else:
+                params.append(QueryBuilder.sanitize_value(val))
+        return params
+    
+    @staticmethod
+    def _order_terms(order_by: Optional[List[Any]]) -> List[Tuple[str, str]]:
+        """Normalise ORDER BY items ('col' or ('col', 'ASC'|'DESC')) to (col, direction)"""
+        terms = []
+        for item in order_by or []:
+            col, direction = (item, 'ASC') if isinstance(item, str) else item
+            direction = direction.strip().upper()
+            if direction not in ('ASC', 'DESC'):
+                raise ValueError(f"Invalid sort direction: {direction}")
+            terms.append((col, direction))
+        return terms
+    
+    @staticmethod
+    def select_shape(table: str, filters: List[Tuple[str, str, Any]] = None,
+                     columns: Optional[List[str]] = None, order_by: Optional[List[Any]] = None,
+                     limit: Optional[int] = None, offset: Optional[int] = None,
+                     seek: Optional[List[Any]] = None) -> Tuple:
+        """Statement-shape key of build_select_query(...) with the same arguments"""
+        shape = ('select', table, QueryBuilder._filter_shape(filters))
+        if columns or order_by or limit is not None or offset is not None or seek is not None:
+            shape += (tuple(columns or ()),
+                      tuple(QueryBuilder._order_terms(order_by)),
+                      ('seek' if seek is not None else '-')
+                      + ('+limit' if limit is not None else '')
+                      + ('+offset' if offset is not None else ''))
+        return shape
+    
+    @staticmethod
+    def select_params(filters: List[Tuple[str, str, Any]] = None,
+                      order_by: Optional[List[Any]] = None, limit: Optional[int] = None,
+                      offset: Optional[int] = None, seek: Optional[List[Any]] = None) -> Tuple:
+        """Parameters for build_select_query(...) in placeholder order"""
+        params = QueryBuilder.filter_params(filters)
+        if seek is not None:
+            seek = [QueryBuilder.sanitize_value(v) for v in seek]
+            terms = QueryBuilder._order_terms(order_by)
+            if len({direction for col, direction in terms}) == 1:
+                params.extend(seek[:len(terms)])
+            else:
+                for i in range(len(terms)):
+                    params.extend(seek[:i + 1])
+        if limit is not None:
+            params.append(int(limit))
+        if offset is not None:
+            params.append(int(offset))
+        return tuple(params)
+    
+    @staticmethod
+    def update_shape(table: str, set_clauses: List[Tuple[str, Any]],
+                     where_clauses: List[Tuple[str, str, Any]]) -> Tuple:
+        """Statement-shape key of build_update_query(...)"""
+        return ('update', table, tuple(col for col, val in set_clauses),
+                QueryBuilder._filter_shape(where_clauses))
+    
+    @staticmethod
+    def insert_shape(table: str, columns: List[str], values_list: List[List[Any]]) -> Tuple:
+        """Statement-shape key of build_insert_query(...)"""
+        return ('insert', table, tuple(columns), len(values_list))
+    
+    @staticmethod
+    def build_select_query(table: str, filters: List[Tuple[str, str, Any]] = None,
+                           columns: Optional[List[str]] = None, order_by: Optional[List[Any]] = None,
+                           limit: Optional[int] = None, offset: Optional[int] = None,
+                           seek: Optional[List[Any]] = None) -> sql.Composed:
+        """Build SELECT query with parameterized filters
+        
+        `columns` restricts the projection, `order_by` takes 'col' or
+        ('col', 'ASC'|'DESC') items, and `limit` / `offset` add placeholders
+        when not None. `seek` (the ORDER BY values of the last row seen)
+        adds a keyset predicate that starts right after that row; the
+        ordering should end in a unique column and not involve NULLs.
+        Values are bound by select_params(...), not embedded in the text.
+        """
+        if not QueryBuilder.validate_identifier(table):
+            raise ValueError(f"Invalid table name: {table}")
+        
+        projection = sql.SQL("*")
+        if columns:
+            for col in columns:
                 if not QueryBuilder.validate_identifier(table, col):
                     raise ValueError(f"Invalid column name: {col}")
-                
-                if op.upper() == 'IN':
-                    # Handle IN clause with multiple values
-                    placeholders = sql.SQL(', ').join([sql.Placeholder()] * len(val))
-                    conditions.append(
-                        sql.SQL("{} IN ({})").format(
-                            sql.Identifier(col),
-                            placeholders
-                        )
-                    )
-                else:
-                    conditions.append(
-                        sql.SQL("{} {} {}").format(
-                            sql.Identifier(col),
-                            sql.SQL(op),
-                            sql.Placeholder()
-                        )
-                    )
-            
+            projection = sql.SQL(", ").join(map(sql.Identifier, columns))
+        query = sql.SQL("SELECT {} FROM {}").format(projection, sql.Identifier(table))
+        
+        conditions = [
+            QueryBuilder._build_condition(table, col, op)
+            for col, op, val in filters or []
+        ]
+        
+        terms = QueryBuilder._order_terms(order_by)
+        for col, direction in terms:
+            if not QueryBuilder.validate_identifier(table, col):
+                raise ValueError(f"Invalid column name: {col}")
+        
+        if seek is not None:
+            if not terms:
+                raise ValueError("Keyset seek requires ORDER BY columns")
+            directions = {direction for col, direction in terms}
+            if len(directions) == 1:
+                # Row comparison (a, b) > (x, y) is usable as a composite index bound
+                conditions.append(sql.SQL("({}) {} ({})").format(
+                    sql.SQL(", ").join(sql.Identifier(col) for col, _ in terms),
+                    sql.SQL(">" if directions == {'ASC'} else "<"),
+                    sql.SQL(", ").join(sql.Placeholder() for _ in terms)
+                ))
+            else:
+                # Mixed ASC/DESC: expand into a = x AND b < y style alternatives
+                alternatives = []
+                for i, (col, direction) in enumerate(terms):
+                    parts = [sql.SQL("{} = {}").format(sql.Identifier(prev), sql.Placeholder())
+                             for prev, _ in terms[:i]]
+                    parts.append(sql.SQL("{} {} {}").format(
+                        sql.Identifier(col),
+                        sql.SQL(">" if direction == 'ASC' else "<"),
+                        sql.Placeholder()
+                    ))
+                    alternatives.append(sql.SQL("({})").format(sql.SQL(" AND ").join(parts)))
+                conditions.append(sql.SQL("({})").format(sql.SQL(" OR ").join(alternatives)))
+        
+        if conditions:
             query = sql.SQL("{} WHERE {}").format(
                 query,
                 sql.SQL(" AND ").join(conditions)
             )
         
+        if terms:
+            query = sql.SQL("{} ORDER BY {}").format(query, sql.SQL(", ").join(
+                sql.SQL("{} {}").format(sql.Identifier(col), sql.SQL(direction))
+                for col, direction in terms
+            ))
+        if limit is not None:
+            query = sql.SQL("{} LIMIT {}").format(query, sql.Placeholder())
+        if offset is not None:
+            query = sql.SQL("{} OFFSET {}").format(query, sql.Placeholder())
+        
         return query
     
     @staticmethod
     def build_update_query(table: str, set_clauses: List[Tuple[str, Any]], 
                           where_clauses: List[Tuple[str, str, Any]]) -> sql.Composed:
         """Build UPDATE query with parameterized values"""
-        if not QueryBuilder.validate_identifier(table):
-            raise ValueError(f"Invalid table name: {table}")
+        if not QueryBuilder.validate_writable(table):
+            raise ValueError(f"Invalid or read-only table: {table}")
         
         # Build SET clause
         set_parts = []
@@ -87,27 +375,10 @@ class QueryBuilder:
             )
         
         # Build WHERE clause
-        where_parts = []
-        for col, op, val in where_clauses:
-            if not QueryBuilder.validate_identifier(table, col):
-                raise ValueError(f"Invalid column name: {col}")
-            
-            if op.upper() == 'IN':
-                placeholders = sql.SQL(', ').join([sql.Placeholder()] * len(val))
-                where_parts.append(
-                    sql.SQL("{} IN ({})").format(
-                        sql.Identifier(col),
-                        placeholders
-                    )
-                )
-            else:
-                where_parts.append(
-                    sql.SQL("{} {} {}").format(
-                        sql.Identifier(col),
-                        sql.SQL(op),
-                        sql.Placeholder()
-                    )
-                )
+        where_parts = [
+            QueryBuilder._build_condition(table, col, op)
+            for col, op, val in where_clauses
+        ]
         
         query = sql.SQL("UPDATE {} SET {} WHERE {}").format(
             sql.Identifier(table),
@@ -117,12 +388,284 @@ class QueryBuilder:
         
         return query
     
+    @staticmethod
+    def _join_columns(table: str, other: str) -> Tuple[str, str]:
+        """(foreign key column of table, referenced column) leading to other"""
+        catalog = QueryBuilder.catalog
+        for col, (ref_table, ref_col) in (catalog.foreign_keys(table) if catalog else {}).items():
+            if ref_table == other:
+                return col, ref_col
+        raise ValueError(f"No foreign key from {table} to {other}")
+    
+    @staticmethod
+    def _column_ref(table: str, ref: str, joins: Dict[str, Tuple[str, str]]) -> sql.Identifier:
+        """Qualified column: 'col' of table, or 'other.col' of a table it references"""
+        other, _, col = ref.rpartition('.')
+        if other and other != table:
+            if not QueryBuilder.validate_identifier(other, col):
+                raise ValueError(f"Invalid column name: {ref}")
+            joins.setdefault(other, QueryBuilder._join_columns(table, other))
+            return sql.Identifier(other, col)
+        if not QueryBuilder.validate_identifier(table, col):
+            raise ValueError(f"Invalid column name: {ref}")
+        return sql.Identifier(table, col)
+    
+    @staticmethod
+    def _expression(table: str, term: Any, joins: Dict[str, Tuple[str, str]]) -> sql.Composable:
+        """Column reference, numeric literal or (op, left, right) arithmetic"""
+        if isinstance(term, (int, float)) and not isinstance(term, bool):
+            return sql.Literal(term)
+        if isinstance(term, str):
+            return QueryBuilder._column_ref(table, term, joins)
+        op, left, right = term
+        if op not in QueryBuilder.EXPRESSION_OPERATORS:
+            raise ValueError(f"Invalid operator: {op}")
+        return sql.SQL("({} {} {})").format(
+            QueryBuilder._expression(table, left, joins),
+            sql.SQL(op),
+            QueryBuilder._expression(table, right, joins)
+        )
+    
+    @staticmethod
+    def _freeze(value: Any) -> Any:
+        """Nested lists to tuples, so report specs can be part of a shape key"""
+        if isinstance(value, (list, tuple)):
+            return tuple(QueryBuilder._freeze(v) for v in value)
+        return value
+    
+    @staticmethod
+    def aggregate_shape(table: str, group_by: List[Any], aggregates: List[Tuple[str, Any, str]],
+                        filters: List[Tuple[str, str, Any]] = None,
+                        order_by: Optional[List[Any]] = None, limit: Optional[int] = None) -> Tuple:
+        """Statement-shape key of build_aggregate_query(...)"""
+        return ('aggregate', table, QueryBuilder._freeze(group_by or []),
+                QueryBuilder._freeze(aggregates), QueryBuilder._filter_shape(filters),
+                tuple(QueryBuilder._order_terms(order_by)), limit is not None)
+    
+    @staticmethod
+    def build_aggregate_query(table: str, group_by: List[Any], aggregates: List[Tuple[str, Any, str]],
+                              filters: List[Tuple[str, str, Any]] = None,
+                              order_by: Optional[List[Any]] = None,
+                              limit: Optional[int] = None) -> sql.Composed:
+        """Build a GROUP BY query that summarises a table in the database
+        
+        `group_by` items are 'col', 'other_table.col' (joined through a
+        foreign key of `table`) or (unit, col) for a date_trunc bucket named
+        after the unit. `aggregates` are (function, term, alias) where term is
+        '*' (COUNT only), a column, a number or an (op, left, right) tuple,
+        e.g. ('SUM', ('*', 'price', 'quantity'), 'stock_value'). `filters`
+        apply to `table`; `order_by` names output columns (default: the
+        groups). Parameters are filter_params(filters) plus the limit.
+        """
+        if not QueryBuilder.validate_identifier(table):
+            raise ValueError(f"Invalid table name: {table}")
+        
+        joins: Dict[str, Tuple[str, str]] = {}
+        outputs = []
+        groups = []
+        for item in group_by or []:
+            if isinstance(item, str):
+                expression = QueryBuilder._column_ref(table, item, joins)
+                alias = item.rpartition('.')[2]
+            else:
+                unit, ref = item
+                if unit not in QueryBuilder.DATE_BUCKETS:
+                    raise ValueError(f"Invalid date bucket: {unit}")
+                expression = sql.SQL("date_trunc({}, {})").format(
+                    sql.Literal(unit), QueryBuilder._column_ref(table, ref, joins)
+                )
+                alias = unit
+            groups.append(expression)
+            outputs.append((expression, alias))
+        
+        for func, term, alias in aggregates:
+            func = func.strip().upper()
+            if func not in QueryBuilder.AGGREGATE_FUNCTIONS:
+                raise ValueError(f"Invalid aggregate function: {func}")
+            if term == '*':
+                if func != 'COUNT':
+                    raise ValueError(f"{func}(*) is not allowed")
+                argument = sql.SQL("*")
+            else:
+                argument = QueryBuilder._expression(table, term, joins)
+            outputs.append((sql.SQL("{}({})").format(sql.SQL(func), argument), alias))
+        
+        aliases = [alias for expression, alias in outputs]
+        if not aggregates or len(set(aliases)) != len(aliases):
+            raise ValueError("Aggregates are required and output names must be unique")
+        
+        query = sql.SQL("SELECT {} FROM {}").format(
+            sql.SQL(", ").join(
+                sql.SQL("{} AS {}").format(expression, sql.Identifier(alias))
+                for expression, alias in outputs
+            ),
+            sql.Identifier(table)
+        )
+        for other, (fk_column, ref_column) in joins.items():
+            query = sql.SQL("{} LEFT JOIN {} ON {} = {}").format(
+                query, sql.Identifier(other),
+                sql.Identifier(other, ref_column), sql.Identifier(table, fk_column)
+            )
+        
+        if filters:
+            query = sql.SQL("{} WHERE {}").format(query, sql.SQL(" AND ").join(
+                QueryBuilder._build_condition(table, col, op, qualified=True)
+                for col, op, val in filters
+            ))
+        if groups:
+            query = sql.SQL("{} GROUP BY {}").format(query, sql.SQL(", ").join(groups))
+        
+        terms = QueryBuilder._order_terms(order_by) or [(alias, 'ASC') for alias in aliases[:len(groups)]]
+        for alias, direction in terms:
+            if alias not in aliases:
+                raise ValueError(f"Invalid sort column: {alias}")
+        if terms:
+            query = sql.SQL("{} ORDER BY {}").format(query, sql.SQL(", ").join(
+                sql.SQL("{} {}").format(sql.Identifier(alias), sql.SQL(direction))
+                for alias, direction in terms
+            ))
+        if limit is not None:
+            query = sql.SQL("{} LIMIT {}").format(query, sql.Placeholder())
+        
+        return query
+    
+    @staticmethod
+    def build_page_query(table: str, direction: str = 'first') -> sql.Composed:
+        """Build a keyset-paginated SELECT over the table's primary key
+        
+        'first' takes (limit,), 'next' takes (last_key, limit) and 'prev'
+        takes (first_key, limit); 'prev' rows come back in descending order.
+        Each page is a single index range scan regardless of depth.
+        """
+        if direction not in ('first', 'next', 'prev'):
+            raise ValueError(f"Invalid page direction: {direction}")
+        key = QueryBuilder.primary_key(table)
+        
+        return QueryBuilder.build_select_query(
+            table,
+            order_by=[(key, 'DESC' if direction == 'prev' else 'ASC')],
+            seek=None if direction == 'first' else [None],
+            limit=0
+        )
+    
+    @staticmethod
+    def page_shape(table: str, direction: str = 'first') -> Tuple:
+        """Statement-shape key of build_page_query(table, direction)"""
+        return ('select', table, 'page', direction)
+    
+    @staticmethod
+    def bulk_update_shape(table: str, key_column: str, columns: List[str]) -> Tuple:
+        """Statement-shape key of build_bulk_update_query(...)"""
+        return ('update', table, 'bulk', key_column, tuple(columns))
+    
+    @staticmethod
+    def build_bulk_update_query(table: str, key_column: str, columns: List[str]) -> sql.Composed:
+        """Set-based UPDATE ... FROM unnest(<typed arrays>) keyed on one column
+        
+        Takes one array parameter for the keys followed by one per column, so
+        the text depends only on the column set, not on the number of rows.
+        Returns the key of every row that was matched.
+        """
+        if not QueryBuilder.validate_writable(table):
+            raise ValueError(f"Invalid or read-only table: {table}")
+        
+        types = []
+        for col in [key_column] + list(columns):
+            if not QueryBuilder.validate_identifier(table, col):
+                raise ValueError(f"Invalid column name: {col}")
+            column_type = QueryBuilder.catalog.column_type(table, col) if QueryBuilder.catalog else None
+            if not column_type:
+                raise ValueError(f"Unknown type for column: {col}")
+            types.append(column_type)
+        
+        return sql.SQL(
+            "UPDATE {table} AS t SET {sets} FROM unnest({arrays}) AS v({names}) "
+            "WHERE t.{key} = v.{key} RETURNING v.{key}"
+        ).format(
+            table=sql.Identifier(table),
+            sets=sql.SQL(', ').join(
+                sql.SQL("{} = v.{}").format(sql.Identifier(col), sql.Identifier(col))
+                for col in columns
+            ),
+            arrays=sql.SQL(', ').join(
+                sql.SQL("{}::{}[]").format(sql.Placeholder(), sql.SQL(column_type))
+                for column_type in types
+            ),
+            names=sql.SQL(', ').join(map(sql.Identifier, [key_column] + list(columns))),
+            key=sql.Identifier(key_column)
+        )
+    
+    @staticmethod
+    def export_shape(table: str, filters: List[Tuple[str, str, Any]], fmt: str) -> Tuple:
+        """Statement-shape key of an export of build_select_query(table, filters)"""
+        return ('export', table, QueryBuilder._filter_shape(filters), fmt)
+    
+    @staticmethod
+    def build_copy_to_query(select: str, fmt: str = 'csv') -> sql.Composed:
+        """Wrap a fully bound SELECT (from build_select_query) in COPY ... TO STDOUT
+        
+        'jsonl' emits one row_to_json document per line. It uses CSV format
+        with control characters as quote and delimiter, which JSON text can
+        never contain, so the documents come out unescaped.
+        """
+        if fmt == 'csv':
+            return sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER true)").format(
+                sql.SQL(select)
+            )
+        if fmt == 'jsonl':
+            return sql.SQL(
+                "COPY (SELECT row_to_json(export_rows) FROM ({}) AS export_rows) "
+                "TO STDOUT WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"
+            ).format(sql.SQL(select))
+        raise ValueError(f"Invalid export format: {fmt}")
+    
+    @staticmethod
+    def build_value_table_queries(table: str, column: str,
+                                  value_table: str) -> Tuple[sql.Composed, sql.Composed]:
+        """CREATE + COPY statements for a temp table holding filter values
+        
+        The temp table's single `value` column takes the type of table.column,
+        so it can be joined without casts (see build_update_in_table_query).
+        """
+        if not QueryBuilder.validate_identifier(table, column):
+            raise ValueError(f"Invalid column name: {column}")
+        
+        create = sql.SQL(
+            "CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} AS value FROM {} WITH NO DATA"
+        ).format(sql.Identifier(value_table), sql.Identifier(column), sql.Identifier(table))
+        copy = sql.SQL("COPY {} (value) FROM STDIN WITH (FORMAT csv)").format(
+            sql.Identifier(value_table)
+        )
+        return create, copy
+    
+    @staticmethod
+    def build_update_in_table_query(table: str, set_clauses: List[Tuple[str, Any]],
+                                    filter_column: str, value_table: str) -> sql.Composed:
+        """UPDATE filtered by a semi-join against a temp value table"""
+        if not QueryBuilder.validate_writable(table):
+            raise ValueError(f"Invalid or read-only table: {table}")
+        if not QueryBuilder.validate_identifier(table, filter_column):
+            raise ValueError(f"Invalid column name: {filter_column}")
+        
+        set_parts = []
+        for col, val in set_clauses:
+            if not QueryBuilder.validate_identifier(table, col):
+                raise ValueError(f"Invalid column name: {col}")
+            set_parts.append(sql.SQL("{} = {}").format(sql.Identifier(col), sql.Placeholder()))
+        
+        return sql.SQL("UPDATE {} SET {} WHERE {} IN (SELECT value FROM {})").format(
+            sql.Identifier(table),
+            sql.SQL(", ").join(set_parts),
+            sql.Identifier(filter_column),
+            sql.Identifier(value_table)
+        )
+    
     @staticmethod
     def build_insert_query(table: str, columns: List[str], 
                           values_list: List[List[Any]]) -> sql.Composed:
         """Build INSERT query with parameterized values"""
-        if not QueryBuilder.validate_identifier(table):
-            raise ValueError(f"Invalid table name: {table}")
+        if not QueryBuilder.validate_writable(table):
+            raise ValueError(f"Invalid or read-only table: {table}")
         
         # Validate all columns
         for col in columns:
@@ -146,6 +689,87 @@ class QueryBuilder:
         
         return query
     
+    @staticmethod
+    def build_related_insert_query(nodes: List[Tuple[str, List[str], Dict[str, Tuple[int, str]], str]]
+                                   ) -> sql.Composed:
+        """Build one statement inserting a parent/child graph via chained CTEs
+        
+        Each node is (table, value_columns, links, key_column) where links maps
+        a foreign key column to (index of an earlier node, referenced column).
+        Value columns take one placeholder each, in node order; linked columns
+        are filled from the earlier node's RETURNING row. The final SELECT
+        returns every node's key column as t0, t1, ...
+        """
+        ctes = []
+        for i, (table, columns, links, key_column) in enumerate(nodes):
+            if not QueryBuilder.validate_writable(table):
+                raise ValueError(f"Invalid or read-only table: {table}")
+            for col in list(columns) + list(links) + [key_column]:
+                if not QueryBuilder.validate_identifier(table, col):
+                    raise ValueError(f"Invalid column name: {col}")
+            
+            target_columns = sql.SQL(', ').join(map(sql.Identifier, list(columns) + list(links)))
+            values = [sql.Placeholder()] * len(columns)
+            sources = []
+            for col, (parent, ref_column) in links.items():
+                if not 0 <= parent < i:
+                    raise ValueError(f"Link for '{col}' must reference an earlier table")
+                parent_table = nodes[parent][0]
+                if not QueryBuilder.validate_identifier(parent_table, ref_column):
+                    raise ValueError(f"Invalid column name: {ref_column}")
+                values.append(sql.SQL("{}.{}").format(sql.Identifier(f"t{parent}"),
+                                                       sql.Identifier(ref_column)))
+                if parent not in sources:
+                    sources.append(parent)
+            
+            if sources:
+                body = sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} RETURNING *").format(
+                    sql.Identifier(table), target_columns, sql.SQL(', ').join(values),
+                    sql.SQL(', ').join(sql.Identifier(f"t{p}") for p in sources)
+                )
+            else:
+                body = sql.SQL("INSERT INTO {} ({}) VALUES ({}) RETURNING *").format(
+                    sql.Identifier(table), target_columns, sql.SQL(', ').join(values)
+                )
+            ctes.append(sql.SQL("{} AS ({})").format(sql.Identifier(f"t{i}"), body))
+        
+        keys = sql.SQL(', ').join(
+            sql.SQL("{}.{} AS {}").format(sql.Identifier(f"t{i}"), sql.Identifier(node[3]),
+                                          sql.Identifier(f"t{i}"))
+            for i, node in enumerate(nodes)
+        )
+        return sql.SQL("WITH {} SELECT {} FROM {}").format(
+            sql.SQL(', ').join(ctes), keys,
+            sql.SQL(', ').join(sql.Identifier(f"t{i}") for i in range(len(nodes)))
+        )
+    
+    @staticmethod
+    def related_insert_shape(nodes: List[Tuple[str, List[str], Dict[str, Tuple[int, str]], str]]) -> Tuple:
+        """Statement-shape key of build_related_insert_query(nodes)"""
+        return ('insert', 'related', tuple(
+            (table, tuple(columns), tuple(sorted(links.items())), key_column)
+            for table, columns, links, key_column in nodes
+        ))
+    
+    @staticmethod
+    def build_copy_from_query(table: str, columns: List[str],
+                              target: Optional[str] = None) -> sql.Composed:
+        """Build COPY ... FROM STDIN (CSV) for whitelisted columns
+        
+        `target` optionally redirects the load into an internal staging table
+        that mirrors `table`'s columns.
+        """
+        if not QueryBuilder.validate_writable(table):
+            raise ValueError(f"Invalid or read-only table: {table}")
+        for col in columns:
+            if not QueryBuilder.validate_identifier(table, col):
+                raise ValueError(f"Invalid column name: {col}")
+        
+        return sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+            sql.Identifier(target or table),
+            sql.SQL(', ').join(map(sql.Identifier, columns))
+        )
+    
     @staticmethod
     def sanitize_value(value: Any) -> Any:
         """Sanitize input values"""
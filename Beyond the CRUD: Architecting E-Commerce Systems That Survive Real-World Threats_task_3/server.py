@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+HTTP/JSON API over InventoryOperations
+
+asyncio front end (keep-alive HTTP/1.1) with the blocking psycopg2 work run
+on the DatabaseManager connection pool via a bounded thread executor.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from urllib.parse import urlsplit, parse_qsl
+from database import DatabaseManager
+from operations import InventoryOperations
+from security import QueryBuilder
+
+
+class HttpError(Exception):
+    """Request failure mapped to an HTTP status"""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class InventoryServer:
+    """Product lookup, filter, stock movement and bulk insert endpoints
+    
+    At most `max_in_flight` requests hold a pooled connection at a time; up
+    to `max_queued` more wait for one and anything beyond that is refused
+    with 503 so overload does not pile up as latency. A request running
+    longer than `request_timeout` gets 504 and its statement is cancelled.
+    """
+    
+    REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+               431: 'Request Header Fields Too Large', 500: 'Internal Server Error',
+               503: 'Service Unavailable', 504: 'Gateway Timeout'}
+    
+    MAX_HEADER_BYTES = 16384
+    
+    def __init__(self, db: DatabaseManager, operations: InventoryOperations,
+                 config: Optional[ConfigParser] = None):
+        if db.pool is None:
+            raise RuntimeError("The HTTP server needs pooled mode ([application] max_connections > 1)")
+        config = config or ConfigParser()
+        self.db = db
+        self.operations = operations
+        # The session connection keeps one pool slot for itself
+        self.max_in_flight = config.getint('server', 'max_in_flight',
+                                           fallback=max(1, db.pool.maxconn - 1))
+        self.max_queued = config.getint('server', 'max_queued', fallback=100)
+        self.request_timeout = config.getfloat('server', 'request_timeout', fallback=10.0)
+        self.idle_timeout = config.getfloat('server', 'idle_timeout', fallback=30.0)
+        self.max_body_bytes = config.getint('server', 'max_body_bytes', fallback=10 * 1024 * 1024)
+        self.max_rows = config.getint('server', 'max_rows', fallback=1000)
+        
+        self.executor = ThreadPoolExecutor(self.max_in_flight, thread_name_prefix='inventory-db')
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._queued = 0
+        self._in_flight = 0
+        self.rejected = 0
+        self.timeouts = 0
+        
+        # (method, path pattern, request parser, handler, runs on the database); the
+        # parser validates on the event loop, so bad input never takes a pool slot
+        self.routes: List[Tuple[str, re.Pattern, Optional[Callable], Callable, bool]] = [
+            ('GET', re.compile(r'/health'), None, self._health, False),
+            ('GET', re.compile(r'/products/(\d+)'), self._parse_product, self._get_product, True),
+            ('GET', re.compile(r'/products'), self._parse_find_products, self._select, True),
+            ('POST', re.compile(r'/filter'), self._parse_filter, self._select, True),
+            ('POST', re.compile(r'/stock-movements'), self._parse_stock_movements,
+             self._stock_movements, True),
+            ('POST', re.compile(r'/bulk-insert'), self._parse_bulk_insert, self._bulk_insert, True),
+        ]
+    
+    # Request parsers (event loop): return the handler arguments or raise HttpError(400)
+    
+    @staticmethod
+    def _parse_product(request: Dict[str, Any], product_id: str) -> Tuple:
+        return (int(product_id),)
+    
+    def _parse_find_products(self, request: Dict[str, Any]) -> Tuple:
+        """GET /products?sku=...&category_id=...&limit=..."""
+        params = dict(request['query'])
+        limit = params.pop('limit', None)
+        filters = [(col, '=', value) for col, value in params.items()]
+        return self._select_args('products', filters, limit=limit)
+    
+    def _parse_filter(self, request: Dict[str, Any]) -> Tuple:
+        body = self._json_body(request)
+        filters = body.get('filters', [])
+        if not isinstance(filters, list):
+            raise HttpError(400, "'filters' must be a list")
+        filters = [tuple(f) if isinstance(f, list) else f for f in filters]
+        for f in filters:
+            if not isinstance(f, tuple) or len(f) != 3 or not isinstance(f[1], str):
+                raise HttpError(400, f"Invalid filter: {f}")
+            QueryBuilder.validate_operator(f[1])
+        return self._select_args(body.get('table'), filters, body.get('columns'),
+                                 body.get('order_by'), body.get('limit'))
+    
+    def _parse_stock_movements(self, request: Dict[str, Any]) -> Tuple:
+        """One movement object, or {"movements": [...], "created_by": ...}"""
+        body = self._json_body(request)
+        movements = body['movements'] if 'movements' in body else [body]
+        if not isinstance(movements, list) or not movements:
+            raise HttpError(400, "No movements given")
+        for movement in movements:
+            if not isinstance(movement, dict):
+                raise HttpError(400, "Each movement must be an object")
+            missing = [key for key in ('product_id', 'movement_type', 'quantity')
+                       if key not in movement]
+            if missing:
+                raise HttpError(400, f"Movement missing {', '.join(missing)}")
+            if str(movement['movement_type']).strip().upper() not in self.operations.MOVEMENT_SIGNS:
+                raise HttpError(400, f"Invalid movement type: {movement['movement_type']}")
+            int(movement['product_id'])
+            if int(movement['quantity']) == 0:
+                raise HttpError(400, "Movement quantity must be non-zero")
+        return movements, body.get('created_by')
+    
+    def _parse_bulk_insert(self, request: Dict[str, Any]) -> Tuple:
+        """{"table": ..., "records": [{...}, ...]}"""
+        body = self._json_body(request)
+        table, records = body.get('table'), body.get('records')
+        if not isinstance(table, str) or not QueryBuilder.validate_writable(table):
+            raise HttpError(400, f"Invalid or read-only table: {table}")
+        if not isinstance(records, list) or not records:
+            raise HttpError(400, "'records' must be a non-empty list")
+        for record in records:
+            if not isinstance(record, dict) or not all(
+                    QueryBuilder.validate_identifier(table, col) for col in record):
+                raise HttpError(400, "Each record must be an object of valid columns")
+        return table, records
+    
+    def _select_args(self, table: Any, filters: List[Tuple[str, str, Any]],
+                     columns: Any = None, order_by: Any = None, limit: Any = None) -> Tuple:
+        """Whitelist a filter query; the row count is capped at max_rows"""
+        if not isinstance(table, str) or not QueryBuilder.validate_identifier(table):
+            raise HttpError(400, f"Invalid table: {table}")
+        if columns is not None and not isinstance(columns, list):
+            raise HttpError(400, "'columns' must be a list")
+        if order_by is not None and not isinstance(order_by, list):
+            raise HttpError(400, "'order_by' must be a list")
+        
+        # 'col' or ["col", "ASC"|"DESC"]
+        terms = []
+        for item in order_by or []:
+            if isinstance(item, str):
+                item = [item, 'ASC']
+            if (not isinstance(item, list) or len(item) != 2
+                    or not all(isinstance(part, str) for part in item)
+                    or item[1].strip().upper() not in ('ASC', 'DESC')):
+                raise HttpError(400, f"Invalid order_by item: {item}")
+            terms.append((item[0], item[1].strip().upper()))
+        
+        for col in [f[0] for f in filters] + list(columns or []) + [col for col, _ in terms]:
+            if not isinstance(col, str) or not QueryBuilder.validate_identifier(table, col):
+                raise HttpError(400, f"Invalid column '{col}' for table '{table}'")
+        
+        if limit is None:
+            limit = self.max_rows
+        else:
+            try:
+                limit = int(limit)
+            except (TypeError, ValueError):
+                raise HttpError(400, f"Invalid limit: {limit}")
+            if limit < 0:
+                raise HttpError(400, "'limit' must not be negative")
+            limit = min(limit, self.max_rows)
+        return table, filters, columns or None, terms or None, limit
+    
+    # Handlers (database ones run on an executor thread holding a pooled connection)
+    
+    def _health(self, request: Dict[str, Any]) -> Tuple[int, Any]:
+        return 200, {'status': 'ok', 'in_flight': self._in_flight, 'queued': self._queued,
+                     'rejected': self.rejected, 'timeouts': self.timeouts,
+                     'pool': self.db.pool_stats()}
+    
+    def _get_product(self, product_id: int) -> Tuple[int, Any]:
+        rows = self._query('products', [('product_id', '=', product_id)])
+        if not rows:
+            raise HttpError(404, f"Product {product_id} not found")
+        return 200, rows[0]
+    
+    def _select(self, *args) -> Tuple[int, Any]:
+        return 200, self._query(*args)
+    
+    def _stock_movements(self, movements: List[Dict[str, Any]],
+                         created_by: Optional[str]) -> Tuple[int, Any]:
+        result = self.operations.record_stock_movements(movements, created_by)
+        if result is None:
+            raise HttpError(500, "Stock movement failed")
+        status = 409 if result['rejected'] and not result['applied'] else 200
+        return status, result
+    
+    def _bulk_insert(self, table: str, records: List[Dict[str, Any]]) -> Tuple[int, Any]:
+        """Generated primary keys of the inserted records"""
+        result = self.operations.insert_multiple_records(table, records)
+        if result is None:
+            raise HttpError(409, "Insert failed (constraint violation or invalid data)")
+        return 201, {'inserted': len(records), 'keys': result}
+    
+    def _query(self, table: str, filters: List[Tuple[str, str, Any]],
+               columns: Optional[List[str]] = None, order_by: Optional[List[Any]] = None,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Run a filter query validated by _select_args"""
+        rows = self.operations.filter_multiple_values(table, filters, columns, order_by,
+                                                      limit, quiet=True)
+        if rows is None:
+            raise HttpError(500, "Query failed")
+        return rows
+    
+    @staticmethod
+    def _json_body(request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            body = json.loads(request['body'] or b'{}')
+        except ValueError:
+            raise HttpError(400, "Request body is not valid JSON")
+        if not isinstance(body, dict):
+            raise HttpError(400, "Request body must be a JSON object")
+        return body
+    
+    # Dispatch
+    
+    def _run_on_connection(self, handler: Callable, args: Tuple, state: Dict[str, Any]):
+        """Executor side: bind a pooled connection to this thread for the handler
+        
+        The connection is published under state['lock'] and withdrawn under it
+        before going back to the pool, so a timeout cancel can only reach this
+        request's statements, never the next user of the connection.
+        """
+        with self.db.checkout() as conn:
+            with state['lock']:
+                state['connection'] = conn
+            try:
+                return handler(*args)
+            finally:
+                with state['lock']:
+                    state['connection'] = None
+    
+    async def _call_db(self, handler: Callable, args: Tuple) -> Tuple[int, Any]:
+        """Run a handler on the pool with backpressure and a timeout"""
+        if self._slots.locked() and self._queued >= self.max_queued:
+            self.rejected += 1
+            raise HttpError(503, "Server busy, retry later")
+        
+        self._queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._queued -= 1
+        
+        self._in_flight += 1
+        state: Dict[str, Any] = {'lock': threading.Lock(), 'connection': None}
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor, self._run_on_connection, handler, args, state
+        )
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            # The worker keeps the connection until the cancelled statement returns
+            with state['lock']:
+                if state['connection'] is not None:
+                    state['connection'].cancel()
+            raise HttpError(504, f"Request exceeded {self.request_timeout:g}s")
+        finally:
+            # The slot is held until the worker really finishes, even after a timeout
+            future.add_done_callback(lambda _: self._release())
+    
+    def _release(self):
+        self._in_flight -= 1
+        self._slots.release()
+    
+    async def dispatch(self, request: Dict[str, Any]) -> Tuple[int, Any]:
+        """Route a parsed request to its handler"""
+        allowed = []
+        for method, pattern, parser, handler, on_db in self.routes:
+            match = pattern.fullmatch(request['path'])
+            if not match:
+                continue
+            if method != request['method']:
+                allowed.append(method)
+                continue
+            try:
+                if parser is None:
+                    args = (request,) + match.groups()
+                else:
+                    args = parser(request, *match.groups())
+                if on_db:
+                    return await self._call_db(handler, args)
+                return handler(*args)
+            except HttpError:
+                raise
+            except (KeyError, TypeError, ValueError) as e:
+                raise HttpError(400, f"Invalid request: {e}")
+        if allowed:
+            raise HttpError(405, f"Use {', '.join(allowed)}")
+        raise HttpError(404, f"No route for {request['path']}")
+    
+    # HTTP protocol
+    
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+        """Parse one request; None when the client closed the connection"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.idle_timeout)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(431, "Request head too large")
+        
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        
+        content_length = headers.get('content-length') or '0'
+        if not (content_length.isascii() and content_length.isdigit()):
+            raise HttpError(400, f"Invalid Content-Length: {content_length}")
+        length = int(content_length)
+        if length > self.max_body_bytes:
+            raise HttpError(413, f"Body exceeds {self.max_body_bytes} bytes")
+        body = b''
+        if length:
+            try:
+                body = await asyncio.wait_for(reader.readexactly(length), self.request_timeout)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                return None
+        
+        url = urlsplit(target)
+        keep_alive = (headers.get('connection', '').lower() != 'close'
+                      if version == 'HTTP/1.1'
+                      else headers.get('connection', '').lower() == 'keep-alive')
+        return {'method': method.upper(), 'path': url.path.rstrip('/') or '/',
+                'query': parse_qsl(url.query), 'headers': headers, 'body': body,
+                'keep_alive': keep_alive}
+    
+    @staticmethod
+    def _json_default(value: Any):
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
+    
+    def _response(self, status: int, payload: Any, keep_alive: bool) -> bytes:
+        body = json.dumps(payload, default=self._json_default).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {self.REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n")
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        return (head + "\r\n").encode('latin-1') + body
+    
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve keep-alive requests on one client connection"""
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    keep_alive = request['keep_alive']
+                    status, payload = await self.dispatch(request)
+                except HttpError as e:
+                    status, payload = e.status, {'error': e.message}
+                except Exception as e:
+                    self.db.log_error("HTTP request failed", e)
+                    status, payload = 500, {'error': 'Internal server error'}
+                
+                writer.write(self._response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080):
+        """Listen until cancelled"""
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        server = await asyncio.start_server(self.handle_connection, host, port,
+                                            limit=self.MAX_HEADER_BYTES, backlog=1024)
+        self.db.log_success(f"HTTP API listening on http://{host}:{port} "
+                            f"({self.max_in_flight} in flight, {self.max_queued} queued)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=True)
+
+
+def main():
+    """Run the API server (database settings as for main.py --batch)"""
+    from main import load_config, batch_credentials
+    
+    parser = argparse.ArgumentParser(description="Inventory HTTP/JSON API")
+    parser.add_argument('--bind', default='127.0.0.1', help="listen address")
+    parser.add_argument('--listen-port', type=int, default=8080, help="listen port")
+    parser.add_argument('--host', help="database host")
+    parser.add_argument('--port', help="database port")
+    parser.add_argument('--database', help="database name")
+    parser.add_argument('--user', help="database user")
+    args = parser.parse_args()
+    
+    config = load_config(os.getenv('APP_CONFIG_FILE'))
+    db = DatabaseManager(os.getenv('APP_LOG_FILE'), config)
+    if not db.connect(*batch_credentials(args, config)):
+        raise SystemExit(1)
+    try:
+        server = InventoryServer(db, InventoryOperations(db), config)
+        asyncio.run(server.serve(args.bind, args.listen_port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
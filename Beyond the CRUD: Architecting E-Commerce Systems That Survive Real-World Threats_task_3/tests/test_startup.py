@@ -0,0 +1,70 @@
+"""
+Startup budget for the CLI entry point
+
+Runs `python -X importtime` in a fresh interpreter and fails when importing
+main.py (or `main.py --help`) pulls in the database stack or the rendering
+libraries, or when importing main costs too much relative to importing the
+database stack on the same machine.
+Run with `python -m pytest tests` or `python -m unittest discover tests`.
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+from typing import Dict, List
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded only once a run connects or renders output, never at import time
+DEFERRED_MODULES = {
+    'psycopg2', 'colorama', 'tabulate', 'pyarrow',
+    'database', 'operations', 'security', 'batch', 'importer', 'advisor',
+}
+
+# `import main` may cost at most this fraction of `import database` (psycopg2 and
+# its extras) measured the same way, so the check follows the host's speed and
+# Python version. Measured ~0.35; ~1.3 when main.py imported the stack eagerly.
+IMPORT_RATIO = float(os.getenv('STARTUP_IMPORT_RATIO', '0.75'))
+
+# Best of several runs, so one slow run on a loaded machine does not fail the test
+RUNS = 3
+
+
+def import_times(args: List[str]) -> Dict[str, int]:
+    """Cumulative import time in microseconds per module imported by `python -X importtime <args>`"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        cwd=APP_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class StartupImportTest(unittest.TestCase):
+    def assert_nothing_deferred(self, times: Dict[str, int]):
+        loaded = {name.split('.')[0] for name in times} & DEFERRED_MODULES
+        self.assertFalse(loaded, f"imported at startup: {sorted(loaded)}")
+
+    def test_import_main_module_set(self):
+        self.assert_nothing_deferred(import_times(['-c', 'import main']))
+
+    def test_help_module_set(self):
+        self.assert_nothing_deferred(import_times(['main.py', '--help']))
+
+    def test_import_main_time(self):
+        main_us = min(import_times(['-c', 'import main'])['main'] for _ in range(RUNS))
+        database_us = min(import_times(['-c', 'import database'])['database'] for _ in range(RUNS))
+        self.assertLess(main_us, IMPORT_RATIO * database_us,
+                        f"import main took {main_us / 1000:.1f} ms, import database "
+                        f"{database_us / 1000:.1f} ms (budget ratio {IMPORT_RATIO})")
+
+
+if __name__ == '__main__':
+    unittest.main()